@@ -24,7 +24,22 @@ import random
 import re
 import time
 import string
+import math
 import copy
+import collections
+import multiprocessing
+import Queue
+import hashlib
+import json
+import tempfile
+import shutil
+import mmap
+import struct
+import errno
+import threading
+import StringIO
+import BaseHTTPServer
+import SocketServer
 import Image, ImageDraw, ImageFont
 from optparse import OptionParser, OptionGroup
 import logging
@@ -46,6 +61,12 @@ except ImportError, inst:
     print("Using PsyCo will speed up this script up to factor 8")
     print("Using PyPy will also speed up your script")
 
+# optional, needed for the numpy engine
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 ## Define some Exceptions
 class SolutionError(Exception):
     pass
@@ -56,6 +77,28 @@ class WordListError(Exception):
 class MaxLoopError(Exception):
     pass
 
+## Yielded by CrossWord.compute_progressive (and passed to the callbacks
+# of compute_crossword) each time a new best crossword was found
+Progress = collections.namedtuple("Progress", "num_placed score round elapsed")
+
+## Yielded by batch_crosswords for each input file. error is None or the
+# message of the exception the file failed with, the timings are seconds
+BatchResult = collections.namedtuple("BatchResult", "inputfile output num_placed num_words score parse_time compute_time render_time error")
+
+## Cell codes of the flat grid. Letters are stored by their byte value,
+# so every code up to BORDER_CELL means "there is no letter here".
+EMPTY_CELL = 0
+BORDER_CELL = 1
+
+## Bits of the per-cell flags (CrossWord.flags): The directions of the 
+# words using a cell, and the directions an empty cell is blocked for as
+# it has letters next to it - above or below blocks horizontal words,
+# left or right blocks vertical words.
+ACROSS = 1
+DOWN = 2
+BLOCKED_ACROSS = 4
+BLOCKED_DOWN = 8
+
 def stats(cwd, print_missing=True):
     """Print some infos about a given crossword."""
     
@@ -71,6 +114,9 @@ def stats(cwd, print_missing=True):
     ## Number of rounds (--)
     print("Needed %i rounds" % cwd.counter)
     
+    ## How to compute this crossword again
+    print("Seed %s, best round %s" % (cwd.seed, cwd.best_round))
+    
     ## average number of crosses per word
     score = float(cwd.score)
     print("%f crosses per word" % (float(score-len(cwd.placed_words))/len(cwd.placed_words)))
@@ -81,48 +127,247 @@ def stats(cwd, print_missing=True):
     num_empty = num_cells - num_letters
     print("total-cells/empty-cells- Quotient: %.1f/1 (%i, %i)" % (round(num_cells/num_empty, 1), num_cells, num_empty))
 
-def run_benchmark_test(words=100, num=100, bestof=3):
-    """Generate a lot of crosswords"""
+## Letters of the synthetic word lists, each about as often as in 
+# English text
+BENCHMARK_ALPHABET = "eeeeeeeeeeeettttttttaaaaaaaaoooooooiiiiiiinnnnnnnsssssshhhhhhrrrrrrddddllllcccuuummmwwffggyyppbbvkjxqz"
+
+## The phases timed by run_benchmark. The output formats can be left out.
+BENCHMARK_PHASES = ("parse", "generate", "number", "ascii", "cues", "html", "png")
+BENCHMARK_FORMATS = ("ascii", "cues", "html", "png")
+
+def synthetic_wordlist(num=100, seed=0, lengths=(3, 12), alphabet=BENCHMARK_ALPHABET):
+    """Returns a list of num (answer, clue) tuples with made up answers.
+    The same arguments always give the same list.
+    
+    -- lengths: (shortest, longest) for evenly spread lengths, or a dict
+        of {length: weight}
+    -- alphabet: The letters to pick from - a letter given twice is
+        picked twice as often
+    """
+    
+    rand = random.Random(seed)
+    if isinstance(lengths, dict):
+        choices = []
+        for length, weight in sorted(lengths.iteritems()):
+            choices.extend([length]*weight)
+    else:
+        choices = range(lengths[0], lengths[1]+1)
+    
+    answers = set()
+    wordlist = []
+    while len(wordlist) < num:
+        answer = "".join(rand.choice(alphabet) for i in range(rand.choice(choices)))
+        if answer in answers:
+            continue
+        answers.add(answer)
+        wordlist.append((answer, "Clue %i" % (len(wordlist)+1)))
+    return wordlist
+
+def run_benchmark(words=100, num=20, bestof=3, workers=1, seed=0, lengths=(3, 12), alphabet=BENCHMARK_ALPHABET, engine="python", search="greedy", formats=BENCHMARK_FORMATS, repeats=5, warmup=2):
+    """Time each phase of making a crossword from a synthetic word list:
+    parsing its .cwf file, generating, numbering and each of the given
+    output formats. Everything is repeated num times, run n computing the
+    crossword with the seed derived from seed and n. So the same 
+    arguments do the same work - only the timings differ.
+    
+    -- repeats: How often to time the num runs. The medians of the 
+        repeats show how much the timings vary (see compare_benchmark).
+    -- warmup: Number of runs made first and not timed
+    
+    Formats that fail (e.g. "png" without the font) are left out with a
+    warning. Returns a dict with the settings, the timings of each run
+    by phase, the median of each repeat by phase, the words placed and
+    scores, and their summary (see summarize_benchmark), ready for 
+    json.dumps.
+    """
+    
+    settings = dict(words=words, num=num, bestof=bestof, workers=workers, seed=seed, lengths=lengths, alphabet=alphabet, engine=engine, search=search, repeats=repeats)
+    wordlist = synthetic_wordlist(words, seed, lengths, alphabet)
+    
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "benchmark.cwf")
+        with open(filename, "w") as fh:
+            fh.write("[options]\nquestion first = False\n\n[questions]\n")
+            for answer, clue in wordlist:
+                fh.write("%s = %s\n" % (answer, clue))
+        
+        outputs = {
+            "ascii": lambda formatter: formatter.get_crossword_ascii_grid(False, True),
+            "cues": lambda formatter: formatter.get_crossword_ascii_cues(),
+            "html": lambda formatter: formatter.get_crossword_html_grid(os.path.join(directory, "benchmark.html")),
+            "png": lambda formatter: formatter.get_crossword_image_grid(StringIO.StringIO()),
+        }
+        formats = list(formats)
+        phases = ("parse", "generate", "number") + tuple(formats)
+        samples = dict((phase, [[] for r in range(repeats)]) for phase in phases)
+        placed, scores = [], []
+        ## The warmup runs (repeat None) come first and redo the first
+        # crosswords
+        runs = [(r, i) for r in range(repeats) for i in range(num)]
+        if num:
+            runs = [(None, i % num) for i in range(warmup)] + runs
+        for repeat, i in runs:
+            times = {}
+            start = time.time()
+            wordlist = SimpleParser(filename).get_questions()
+            times["parse"] = time.time() - start
+            
+            start = time.time()
+            cwd = CrossWord("auto", "auto", " ", 5000, wordlist, engine=engine)
+            score = cwd.compute_crossword(best_of=bestof, workers=workers, seed=_derive_seed(seed, i), search=search)
+            times["generate"] = time.time() - start
+            
+            start = time.time()
+            cwd._number_words()
+            times["number"] = time.time() - start
+            
+            formatter = CrossWordFormatter(cwd, order=False)
+            for output in list(formats):
+                start = time.time()
+                try:
+                    outputs[output](formatter)
+                except (IOError, OSError), inst:
+                    logging.warning("Leaving out the '%s' output: %s" % (output, inst))
+                    formats.remove(output)
+                    del samples[output]
+                    continue
+                times[output] = time.time() - start
+            
+            if repeat is None:
+                continue
+            for phase, elapsed in times.iteritems():
+                samples[phase][repeat].append(elapsed)
+            ## Each repeat does the same work
+            if repeat == 0:
+                placed.append(len(cwd.placed_words))
+                scores.append(score)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    timings = dict((phase, sum(runs, [])) for phase, runs in samples.iteritems())
+    medians = dict((phase, [_percentile(run, 50) for run in runs if run]) for phase, runs in samples.iteritems())
+    result = dict(settings=settings, timings=timings, repeats=medians, placed=placed, scores=scores)
+    result["summary"] = summarize_benchmark(result)
+    return result
+
+def summarize_benchmark(result):
+    """Percentiles (p50, p90, p99), mean, min and max of the timings of
+    each phase of a run_benchmark result, the median and the lowest and
+    highest of the medians of the repeats, and the throughput of the 
+    generation: crosswords and placed words per second"""
+    
+    summary = {}
+    for phase, timings in result["timings"].iteritems():
+        if not timings:
+            continue
+        medians = result.get("repeats", {}).get(phase) or [_percentile(timings, 50)]
+        summary[phase] = dict(
+            p50=_percentile(timings, 50), p90=_percentile(timings, 90), p99=_percentile(timings, 99), 
+            mean=sum(timings)/len(timings), min=min(timings), max=max(timings),
+            median=_percentile(medians, 50), low=min(medians), high=max(medians))
+    
+    summary["placed"] = float(sum(result["placed"]))/max(len(result["placed"]), 1)
+    summary["score"] = float(sum(result["scores"]))/max(len(result["scores"]), 1)
+    generate = sum(result["timings"]["generate"])
+    if generate:
+        crosswords = len(result["timings"]["generate"])/generate
+        summary["throughput"] = dict(crosswords=crosswords, words=crosswords*summary["placed"])
+    return summary
+
+def compare_benchmark(result, baseline, threshold=0.05):
+    """Compare the timings of two run_benchmark results by the median of
+    the medians of their repeats. Returns a dict of {phase: (baseline 
+    median, median, ratio, verdict)} - the verdict being "faster" or 
+    "slower" if the ranges of the medians of the repeats do not overlap
+    and the medians differ by more than threshold (Default: 5%) and by
+    more than the noise, the widths of both ranges added up. Otherwise 
+    the verdict is "same".
     
-    print("\nWill create %i crosswords, each best of %i." % (num, bestof))
-    print("So %i crosswords will be generated." % (num*bestof))
+    Results without repeats (of earlier versions) count as a single 
+    repeat, their p50."""
+    
+    comparison = {}
+    for phase in BENCHMARK_PHASES:
+        if phase not in result["summary"] or phase not in baseline["summary"]:
+            continue
+        old = baseline["summary"][phase]
+        new = result["summary"][phase]
+        old_median, old_low, old_high = [old.get(key, old["p50"]) for key in ("median", "low", "high")]
+        new_median, new_low, new_high = [new.get(key, new["p50"]) for key in ("median", "low", "high")]
+        if old_median > 0 and new_median > 0:
+            ratio = new_median/old_median
+            limit = max(threshold, (old_high-old_low)/old_median + (new_high-new_low)/new_median)
+        else:
+            ratio, limit = 1.0, threshold
+        if ratio < 1 - limit and new_high < old_low:
+            verdict = "faster"
+        elif ratio > 1 + limit and new_low > old_high:
+            verdict = "slower"
+        else:
+            verdict = "same"
+        comparison[phase] = (old_median, new_median, ratio, verdict)
+    return comparison
+
+def _percentile(values, percent):
+    """The percent-th percentile of values, interpolated linearly"""
+    
+    values = sorted(values)
+    pos = (len(values)-1)*percent/100.0
+    low = int(pos)
+    high = min(low+1, len(values)-1)
+    return values[low] + (values[high]-values[low])*(pos-low)
+
+def run_benchmark_test(words=100, num=100, bestof=3, workers=1, seed=0, engine="python", search="greedy", output=None, baseline=None, threshold=0.05, repeats=5):
+    """Run run_benchmark and print its summary. Works offline - the 
+    words are made up by synthetic_wordlist.
+    
+    -- repeats: How often to time the num crosswords
+    -- output: Save the result as JSON to this file
+    -- baseline: JSON file of an earlier result to compare with
+    
+    Returns False if the generation got slower than the baseline."""
+    
+    print("\nWill create %i crosswords %i times, each best of %i." % (num, repeats, bestof))
     print("Each crossword will have %i words\n" % words)
     
-    start = time.time()
-    
-    #~ parser = SimpleParser("weimar.cwf")
-    #~ word_list = parser.get_questions()
-    #~ print word_list
-    #~ print word_list
-    #~ raw_input()
-    curdir = os.path.dirname(sys.argv[0])
-    curdir = os.path.abspath(curdir)
-    db = SimpleParser(os.path.join(curdir, "crosswords", "lot_questions.cwf"))
-    word_list = db.get_questions(words)
-    best_score, best_crossword = 0, None
-    cwds = multiple_crosswords("auto","auto", " ", 5000, word_list, num=num, best_of=bestof, force_solved=False)
-    for cwd, score in cwds:
-        if score >= best_score:
-            best_score = score
-            best_crossword = cwd
-    print(70*"=")    
-    print("Best Crossword with %i points:" % best_score)
-    formatter = CrossWordFormatter(best_crossword, ppb=32)#, solution="I solved it")
-    #~ print formatter.get_crossword_ascii_grid(solved=False, printable=True)
-    print formatter.get_crossword_ascii_grid(solved=True, printable=True)
-    #~ print formatter.get_crossword_ascii_cues()
-    #~ print formatter.get_shuffled_word_list()
-    formatter.get_crossword_image_grid(output="benchmark-output-file.png", solved=True)
-    #~ formatter.get_crossword_html_grid(   )
-    stats(best_crossword)
-    #~ print [i.word for i in best_crossword.wordlist]
-    #~ print [i.word for i in best_crossword.placed_words]
-    end = time.time()
-    
-    msg = "= This benchmark took %.4f seconds =" % (end-start)
-    print(len(msg)*"=")
-    print(msg)
-    print(len(msg)*"=")
+    result = run_benchmark(words, num, bestof, workers, seed, engine=engine, search=search, repeats=repeats)
+    summary = result["summary"]
+    
+    print("%-10s %10s %10s %10s %10s %23s" % ("phase", "p50 (ms)", "p90 (ms)", "p99 (ms)", "mean (ms)", "repeats p50 (ms)"))
+    for phase in BENCHMARK_PHASES:
+        if phase in summary:
+            times = summary[phase]
+            print("%-10s %10.3f %10.3f %10.3f %10.3f %10.3f - %-10.3f" % (phase, times["p50"]*1000, times["p90"]*1000, times["p99"]*1000, times["mean"]*1000, times["low"]*1000, times["high"]*1000))
+    if "throughput" in summary:
+        print("\n%.2f crosswords per second, %.1f placed words per second" % (summary["throughput"]["crosswords"], summary["throughput"]["words"]))
+    print("%.1f out of %i words placed, average score %.1f" % (summary["placed"], words, summary["score"]))
+    
+    if output:
+        with open(output, "w") as fh:
+            json.dump(result, fh, indent=2, sort_keys=True)
+        print("\nSaved the result to '%s'" % output)
+    
+    if not baseline:
+        return True
+    with open(baseline) as fh:
+        old = json.load(fh)
+    if old["settings"] != json.loads(json.dumps(result["settings"])):
+        print("\nWarning: The baseline was run with other settings: %s" % old["settings"])
+    
+    print("\nCompared with '%s':" % baseline)
+    comparison = compare_benchmark(result, old, threshold)
+    for phase in BENCHMARK_PHASES:
+        if phase in comparison:
+            before, after, ratio, verdict = comparison[phase]
+            print("%-10s %10.3f -> %10.3f ms  %+6.1f%%  %s" % (phase, before*1000, after*1000, (ratio-1)*100, verdict))
+    if old.get("summary", {}).get("placed") != summary["placed"]:
+        print("Note: %s words placed on average before, %s now" % (old["summary"].get("placed"), summary["placed"]))
+    return comparison["generate"][3] != "slower"
+
+## The lines of a .cwf file, see cwf-spec.txt
+_SECTION_RE = re.compile(r"\s*\[(\w.*)\]")
+_PAIR_RE = re.compile(r"\s*(?P<key>.+?)[ \t]*?[:=][ \t]*(?P<value>.+)")
 
 class SimpleParser(object):
     """A simple parser for .cwf files
@@ -158,78 +403,626 @@ class SimpleParser(object):
         return option in self.dict["options"]
     
     def parse(self, filename):
-        """Parse the given file"""
+        """Parse the given file. Compiled banks (see compile_bank) are
+        read as well - their questions are Word objects."""
+        
+        if is_compiled_bank(filename):
+            bank = CompiledBank(filename)
+            self.dict["options"] = dict(bank.options)
+            self.dict["questions"] = bank.get_questions()
+            bank.close()
+            return
         
-        section = None
-                
         with open(filename, "r") as fh:
-            #~ content = [line.replace() for line in fh]
-            content = fh.read().split("\n")
+            for section, answer, question in self.iter_pairs(fh):
+                self.dict[section].append((answer, question))
+    
+    def iter_questions(self, filename, section="questions"):
+        """Yields the (answer, question) tuples of the given file one by
+        one while reading it - without keeping the file in memory. The 
+        options read so far are in self.dict once the first tuple is 
+        yielded, all of them once the file was read to the end.
+        Compiled banks yield Word objects."""
+        
+        if is_compiled_bank(filename):
+            bank = CompiledBank(filename)
+            self.dict["options"] = dict(bank.options)
+            try:
+                for i in xrange(len(bank)):
+                    yield bank.get_word(i)
+            finally:
+                bank.close()
+            return
         
-        ## First pass: Just get the sections and options!
-        for line in content:
-            rg = re.match(r"\s*\[(\w.*)\]", line) ## Matches a section
-            if rg:
-                # Set current section
-                section = rg.group(1).strip().lower()
-                if not section in self.dict and section == "options":
-                    self.dict[section] = {}
-                elif not section in self.dict:
-                    self.dict[section] = []
-            elif re.match(r"\A\s*\Z", line):
-                # Ignore blank lines
-                pass
-            elif section == "options":
-                rg = re.match(r"\s*(?P<key>.+?)[ \t]*?[:=][ \t]*(?P<value>.+)", line) # Match key = value
-                if rg:
-                    if rg.group("key").strip().lower() == "question first":
-                        self.dict[section]["question first"] = rg.group("value").lower().strip().startswith("t")
-                    else:
-                        self.dict[section][rg.group("key").strip().lower()] = rg.group("value").strip()
+        with open(filename, "r") as fh:
+            for pair_section, answer, question in self.iter_pairs(fh):
+                if pair_section == section:
+                    yield answer, question
+    
+    def iter_pairs(self, fh):
+        """Read the lines of an open .cwf file in one pass. The sections
+        and options are stored in self.dict, the pairs of the other 
+        sections are yielded as (section, answer, question).
+        
+        Whether the question or the answer comes first is only known 
+        from the options. Pairs are yielded right away once the 
+        "question first" option was read, the ones before it are kept
+        (in file order) until then - or until the end of the file."""
+        
+        options = self.dict.setdefault("options", {})
+        pending = []
+        for pair in self._iter_lines(fh):
+            pending.append(pair)
+            if not self._order_known:
+                continue
+            for section, key, value, offset in pending:
+                if options["question first"]:
+                    yield section, value, key
+                else:
+                    yield section, key, value
+            pending = []
+        
+        for section, key, value, offset in pending:
+            if options["question first"]:
+                yield section, value, key
+            else:
+                yield section, key, value
+    
+    def _iter_lines(self, fh):
+        """The single pass over the lines of an open .cwf file behind 
+        iter_pairs: Stores the sections and options in self.dict and 
+        yields (section, key, value, offset) for the pairs of the other
+        sections - offset being the position of the line in the file.
+        self._order_known tells if the "question first" option was read
+        yet."""
+        
+        options = self.dict.setdefault("options", {})
+        self._order_known = False
         
-        if not "options" in self.dict:
-            self.dict["options"] = {}
-                        
-        if not "question first" in self.dict["options"]: self.dict["options"]["question first"] = True
+        ## optimizations
+        match_section = _SECTION_RE.match
+        match_pair = _PAIR_RE.match
         
-        ## Second pass: Get the questions
         section = None
-        for line in content:
-            rg = re.match(r" *\[(\w.*)\]", line)
+        offset = 0
+        for line in fh:
+            line_offset = offset
+            offset += len(line)
+            
+            rg = match_section(line)
             if rg:
                 # Set current section
                 section = rg.group(1).strip().lower()
-            elif re.match(r"\A\s*\Z", line):
-                # Ignore blank lines
-                pass
-            #~ elif section == None:
-                #~ pass
-            elif section != "options":
-                rg = re.match(r"\s*(?P<key>.+?)[ \t]*?[:=][ \t]*(?P<value>.+)", line)
-                if rg:
-                    if self.dict["options"]["question first"]:
-                        self.dict[section].append((rg.group("value").strip(), rg.group("key").strip()))
-                    else:
-                        self.dict[section].append((rg.group("key").strip(), rg.group("value").strip()))
+                if section != "options" and not section in self.dict:
+                    self.dict[section] = []
+                continue
+            if section is None or not line.strip():
+                # Ignore blank lines and lines outside of sections
+                continue
+            
+            rg = match_pair(line)
+            if not rg:
+                continue
+            key, value = rg.group("key").strip(), rg.group("value").strip()
+            if section == "options":
+                if key.lower() == "question first":
+                    options["question first"] = value.lower().startswith("t")
+                    self._order_known = True
+                else:
+                    options[key.lower()] = value
+            else:
+                yield section, key, value, line_offset
+        
+        if not "question first" in options: options["question first"] = True
+
+def _options_from_json(options):
+    """The options of a JSON header just like SimpleParser reads them:
+    json gives unicode, the parser gives UTF-8 strings"""
+    
+    result = {}
+    for key, value in options.iteritems():
+        if isinstance(value, unicode):
+            value = value.encode("utf-8")
+        result[key.encode("utf-8")] = value
+    return result
+
+## See QuestionBank._get_stats
+_LETTER_BITS = dict((letter, 1 << i) for i, letter in enumerate(string.ascii_lowercase))
+
+class QuestionBank(object):
+    """Random questions from big .cwf files, without parsing them
+    
+    The first time a file is opened, the position, answer length and 
+    letters of each pair in its questions section are stored in an 
+    index file next to it (FILE.idx). Later on only the index is read
+    - and of the file, just the lines of the questions drawn. Both are
+    read through mmap. The index is built again if the file changed.
+    
+        bank = QuestionBank("lot_questions.cwf")
+        wordlist = bank.sample(50, seed=1, max_length=12)
+    """
+    
+    ## offset of the line, then length and letters of key and value
+    _RECORD = struct.Struct("<QBIBI")
+    _VERSION = 1
+    
+    def __init__(self, filename, index=None):
+        """-- index: Name of the index file (Default: filename + ".idx").
+            If it can't be written, the index is kept in memory."""
+        
+        self.filename = filename
+        if index is None:
+            index = filename + ".idx"
+        self.index_filename = index
+        
+        self._file = open(filename, "rb")
+        stat = os.fstat(self._file.fileno())
+        if stat.st_size:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = ""
+        
+        self._index_file = None
+        if not self._load_index(stat):
+            self._build_index(stat)
+    
+    def __len__(self):
+        return self.count
+    
+    def close(self):
+        """Close the file and the index"""
+        
+        for data in (self._data, self._index):
+            if isinstance(data, mmap.mmap):
+                data.close()
+        for fh in (self._file, self._index_file):
+            if fh is not None:
+                fh.close()
+    
+    def _load_index(self, stat):
+        """Use the index file if it belongs to the current file"""
+        
+        try:
+            fh = open(self.index_filename, "rb")
+        except IOError:
+            return False
+        try:
+            index = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            start = index.find("\n") + 1
+            header = json.loads(index[:start])
+        except (ValueError, EnvironmentError, mmap.error):
+            fh.close()
+            return False
+        if header.get("version") != self._VERSION or header.get("size") != stat.st_size or header.get("mtime") != stat.st_mtime:
+            index.close()
+            fh.close()
+            return False
+        
+        self._index_file = fh
+        self._setup(index, start, header)
+        return True
+    
+    def _build_index(self, stat):
+        """Index the questions section in one pass over the file and 
+        store the index - or keep it in memory if that fails"""
+        
+        parser = SimpleParser()
+        pack = self._RECORD.pack
+        records = []
+        with open(self.filename, "rb") as fh:
+            for section, key, value, offset in parser._iter_lines(fh):
+                if section == "questions":
+                    records.append(pack(offset, *(self._get_stats(key) + self._get_stats(value))))
+        
+        header = dict(version=self._VERSION, size=stat.st_size, mtime=stat.st_mtime, count=len(records), options=parser.dict["options"])
+        index = "%s\n%s" % (json.dumps(header), "".join(records))
+        
+        directory = os.path.dirname(os.path.abspath(self.index_filename))
+        try:
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(index)
+            os.rename(tmp, self.index_filename)
+        except EnvironmentError, inst:
+            logging.warning("Could not store the index of '%s': %s" % (self.filename, inst))
+        
+        self._setup(index, index.find("\n") + 1, json.loads(index[:index.find("\n")]))
+    
+    def _setup(self, index, start, header):
+        self._index = index
+        self._start = start
+        self.count = header["count"]
+        self.options = _options_from_json(header["options"])
+        ## Key and value of a record: The answer comes second if the 
+        # question comes first
+        self._answer = self.options["question first"] and 1 or 0
+    
+    @staticmethod
+    def _get_stats(answer):
+        """Length (up to 255) and letter bits of an answer - bit 0 for
+        'a' up to bit 25 for 'z', bit 26 for any other letter"""
+        
+        answer = "".join(answer.lower().split())
+        letters = 0
+        for letter in set(answer):
+            letters |= _LETTER_BITS.get(letter, 1 << 26)
+        return min(len(answer), 255), letters
+    
+    def _get_record(self, i):
+        """Returns (offset, answer length, answer letters) of pair i"""
+        
+        record = self._RECORD.unpack_from(self._index, self._start + i*self._RECORD.size)
+        if self._answer:
+            return record[0], record[3], record[4]
+        return record[0], record[1], record[2]
+    
+    def get(self, i):
+        """Returns pair i as an (answer, question) tuple"""
+        
+        offset = self._get_record(i)[0]
+        end = self._data.find("\n", offset)
+        if end == -1:
+            end = len(self._data)
+        rg = _PAIR_RE.match(self._data[offset:end])
+        key, value = rg.group("key").strip(), rg.group("value").strip()
+        if self._answer:
+            return value, key
+        return key, value
+    
+    def sample(self, num, seed=None, min_length=None, max_length=None, letters=None, method="random"):
+        """Returns num (answer, question) tuples drawn at random - or all
+        of them, if there are fewer which pass the filters.
+        
+        -- seed: The same seed draws the same questions (Default: random)
+        -- min_length, max_length: Length of the answers (spaces don't 
+            count, answers of 255 letters or more count as 255)
+        -- letters: The letters the answers may consist of, e.g. 
+            string.ascii_lowercase to leave out answers with umlauts
+        -- method: "random" picks random pairs until enough pass the 
+            filters - it reads about num/(share passing the filters) 
+            records. "reservoir" runs over the whole index once, which
+            is better if only a few pairs pass the filters. 
+        """
+        
+        if method not in ("random", "reservoir"):
+            raise ValueError("Unknown method '%s'" % method)
+        rand = random.Random(seed)
+        
+        if letters is None:
+            allowed = None
+        else:
+            allowed = self._get_stats(letters)[1]
+        def accept(i):
+            offset, length, answer_letters = self._get_record(i)
+            if min_length is not None and length < min_length:
+                return False
+            if max_length is not None and length > max_length:
+                return False
+            return allowed is None or not answer_letters & ~allowed
+        
+        chosen = None
+        if method == "random":
+            if min_length is None and max_length is None and allowed is None:
+                chosen = rand.sample(xrange(self.count), min(num, self.count))
+            else:
+                ## Give up on it if too few pairs pass the filters
+                chosen, tried = [], set()
+                tries = 0
+                while len(chosen) < num and len(tried) < self.count and tries < 20*num + 100:
+                    tries += 1
+                    i = rand.randrange(self.count)
+                    if i in tried:
+                        continue
+                    tried.add(i)
+                    if accept(i):
+                        chosen.append(i)
+                if len(chosen) < num and len(tried) < self.count:
+                    chosen = None
+        if chosen is None:
+            ## Reservoir sampling: Each pair passing the filters ends up 
+            # in chosen with the same chance
+            chosen = []
+            seen = 0
+            for i in xrange(self.count):
+                if not accept(i):
+                    continue
+                seen += 1
+                if len(chosen) < num:
+                    chosen.append(i)
+                else:
+                    j = rand.randrange(seen)
+                    if j < num:
+                        chosen[j] = i
+            rand.shuffle(chosen)
+        return [self.get(i) for i in chosen]
+
+## First bytes of a compiled bank. No .cwf file starts with them.
+BANK_MAGIC = "\x00CWB\n"
+
+def is_compiled_bank(filename):
+    """True if the file is a compiled bank (see compile_bank)"""
+    
+    with open(filename, "rb") as fh:
+        return fh.read(len(BANK_MAGIC)) == BANK_MAGIC
+
+def compile_bank(inputfiles, output):
+    """Compile the questions of one or more .cwf files into one binary
+    bank, which CompiledBank reads without parsing anything. The bank 
+    holds the normalized answers (see Word), the clues, the lengths and
+    the letter histograms. The options are those of the first file, 
+    options of the other files are added if the first one lacks them.
+    
+    Layout: BANK_MAGIC, a JSON header line (version, count, options), a
+    table of one record per question, and the data the records point to:
+    the answer, its distinct letters, how often each of them is in the 
+    answer (one byte each) and the clue.
+    
+    Returns the number of questions."""
+    
+    options = {}
+    records, data = [], []
+    size = 0
+    for inputfile in inputfiles:
+        parser = SimpleParser()
+        with open(inputfile, "r") as fh:
+            for section, answer, question in parser.iter_pairs(fh):
+                if section != "questions":
+                    continue
+                word = Word(answer, question)
+                if word.length > 255:
+                    raise WordListError("Answer too long for a bank: '%s'" % word.word)
+                letters = "".join(sorted(word.histogram))
+                counts = str(bytearray(word.histogram[letter] for letter in letters))
+                records.append((size, word.length, len(letters), len(question)))
+                data.extend((word.word, letters, counts, question))
+                size += word.length + 2*len(letters) + len(question)
+        for key, value in parser.dict["options"].iteritems():
+            options.setdefault(key, value)
+    
+    header = "%s%s\n" % (BANK_MAGIC, json.dumps(dict(version=CompiledBank.VERSION, count=len(records), options=options)))
+    start = len(header) + len(records)*CompiledBank._RECORD.size
+    pack = CompiledBank._RECORD.pack
+    
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(header)
+            fh.write("".join(pack(start + offset, answer_length, histogram_length, clue_length) for offset, answer_length, histogram_length, clue_length in records))
+            fh.write("".join(data))
+        os.rename(tmp, output)
+    except:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return len(records)
+
+class CompiledBank(object):
+    """A bank of questions made by compile_bank, read through mmap. An 
+    entry is only sliced out of the file when it is asked for, and 
+    turned into a Word without normalizing the answer again.
+    
+    SimpleParser and CrossWord read banks as well:
+    
+        CrossWord("auto", "auto", wordlist=CompiledBank("words.cwb"))
+    """
+    
+    VERSION = 1
+    
+    ## offset of the entry, length of the answer, number of distinct 
+    # letters and length of the clue
+    _RECORD = struct.Struct("<QBBI")
+    
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = len(BANK_MAGIC)
+        if self._data[:start] != BANK_MAGIC:
+            self.close()
+            raise WordListError("'%s' is not a compiled bank" % filename)
+        end = self._data.find("\n", start)
+        header = json.loads(self._data[start:end])
+        if header["version"] != self.VERSION:
+            self.close()
+            raise WordListError("'%s' is a bank of version %s - please compile it again" % (filename, header["version"]))
+        self.options = _options_from_json(header["options"])
+        self.count = header["count"]
+        self._start = end + 1
+    
+    def __len__(self):
+        return self.count
+    
+    def close(self):
+        self._data.close()
+        self._file.close()
+    
+    def get_word(self, i):
+        """Returns entry i as a Word"""
+        
+        data = self._data
+        offset, answer_length, num_letters, clue_length = self._RECORD.unpack_from(data, self._start + i*self._RECORD.size)
+        letters = offset + answer_length
+        counts = letters + num_letters
+        clue = counts + num_letters
+        histogram = dict(zip(data[letters:counts], bytearray(data[counts:clue])))
+        return Word.from_normalized(data[offset:letters], data[clue:clue+clue_length], histogram)
+    
+    def get_histogram(self, i):
+        """Returns the letters of entry i and how often each is in its
+        answer as a dict - without making a Word"""
+        
+        data = self._data
+        offset, answer_length, num_letters, clue_length = self._RECORD.unpack_from(data, self._start + i*self._RECORD.size)
+        letters = offset + answer_length
+        counts = letters + num_letters
+        return dict(zip(data[letters:counts], bytearray(data[counts:counts+num_letters])))
+    
+    def get_questions(self, num=None):
+        """Returns the first num entries (Default: None = All) as Words"""
+        
+        if not num:
+            num = self.count
+        return [self.get_word(i) for i in xrange(min(num, self.count))]
+    
+    def sample(self, num, seed=None):
+        """Returns num entries drawn at random as Words - with the same 
+        seed the same ones"""
+        
+        return [self.get_word(i) for i in random.Random(seed).sample(xrange(self.count), min(num, self.count))]
+
+def select_words(words, num, min_length=None, max_length=None, method="greedy", seed=None, pool_size=None):
+    """Pick num words of a (much) bigger list which cross each other 
+    well. The result is a list of Words, ready for CrossWord.
+    
+    A word can cross another one at each letter they share, but not at
+    two letters next to each other. So its expected number of crosses
+    with the words picked so far is taken from the letters at its even
+    or its odd positions (whichever is better), each letter counting 
+    c/(c+1) if c of the picked words have it. That is divided by the 
+    most crosses a word of its length can have. Starting with the word
+    crossing best with the whole pool, the word with the most expected
+    crosses is picked next, until there are num.
+    
+    -- words: (answer, clue) tuples, Words or a CompiledBank
+    -- min_length, max_length: Length of the answers to pick
+    -- method: "greedy" always picks the best word, "stochastic" picks
+        one of the 8 best at random, the better ones more likely - so
+        each seed gives another selection
+    -- seed: For the random pool and the stochastic picks
+    -- pool_size: Number of words drawn at random from a bigger list to
+        pick from (Default: 20*num)
+    """
+    
+    if method not in ("greedy", "stochastic"):
+        raise ValueError("Unknown method '%s'" % method)
+    rand = random.Random(seed)
+    if pool_size is None:
+        pool_size = 20*num
+    
+    if isinstance(words, CompiledBank):
+        get_word = words.get_word
+    else:
+        def get_word(i):
+            word = words[i]
+            if not isinstance(word, Word):
+                word = Word(word[0], word[1])
+            return word
+    def fits(word):
+        return (min_length is None or word.length >= min_length) and (max_length is None or word.length <= max_length)
+    
+    ## The pool: All the words - or pool_size of them drawn at random
+    count = len(words)
+    pool = None
+    if count > pool_size:
+        pool, tried = [], set()
+        while len(pool) < pool_size and len(tried) < count and len(tried) < 20*pool_size:
+            i = rand.randrange(count)
+            if i in tried:
+                continue
+            tried.add(i)
+            word = get_word(i)
+            if fits(word):
+                pool.append(word)
+        if len(pool) < pool_size and len(tried) < count:
+            ## Too few words of the right length to find them that way
+            pool = None
+    if pool is None:
+        pool = [word for word in (get_word(i) for i in xrange(count)) if fits(word)]
+        if len(pool) > pool_size:
+            pool = rand.sample(pool, pool_size)
+    
+    seen = set()
+    pool = [word for word in pool if not (word.word in seen or seen.add(word.word))]
+    if len(pool) <= num:
+        return pool
+    
+    ## The letter-position index: For each letter the words having it,
+    # and how often at even and at odd positions
+    index = {}
+    for i, word in enumerate(pool):
+        positions = {}
+        for pos, letter in enumerate(word.word):
+            positions.setdefault(letter, [0, 0])[pos % 2] += 1
+        for letter, (even, odd) in positions.iteritems():
+            index.setdefault(letter, []).append((i, even, odd))
+    
+    even_sums = [0.0]*len(pool)
+    odd_sums = [0.0]*len(pool)
+    def add_weight(letter, weight):
+        for i, even, odd in index[letter]:
+            even_sums[i] += even*weight
+            odd_sums[i] += odd*weight
+    
+    ## Long words are not better just for having more letters
+    max_crosses = [(word.length + 1)//2 for word in pool]
+    
+    picked = [False]*len(pool)
+    def pick():
+        ranked = sorted((-max(even_sums[i], odd_sums[i])/max_crosses[i], i) for i in xrange(len(pool)) if not picked[i])
+        if method == "greedy":
+            return ranked[0][1]
+        best = ranked[:8]
+        total = -sum(potential for potential, i in best)
+        if total <= 0:
+            return rand.choice(best)[1]
+        x = rand.uniform(0, total)
+        for potential, i in best:
+            x += potential
+            if x <= 0:
+                return i
+        return best[-1][1]
+    
+    ## The first word: As many words of num as there would be in a 
+    # random selection
+    for letter, postings in index.iteritems():
+        expected = len(postings)*float(num)/len(pool)
+        add_weight(letter, expected/(expected + 1))
+    first = pick()
+    even_sums = [0.0]*len(pool)
+    odd_sums = [0.0]*len(pool)
+    
+    counts = dict.fromkeys(index, 0)
+    selected = []
+    i = first
+    while True:
+        picked[i] = True
+        selected.append(pool[i])
+        if len(selected) == num:
+            break
+        for letter in pool[i].histogram:
+            c = counts[letter]
+            counts[letter] = c + 1
+            add_weight(letter, (c + 1.0)/(c + 2) - float(c)/(c + 1))
+        i = pick()
+    return selected
 
- 
 class CrossWordFormatter(object):
     """Formatting Crosswords
     
     This class manages the various ways of crossword-output. Do you want
     it as html, image, text, solved or unsolved?"""
     
-    def __init__(self, crossword, ppb=32, solution=None, transparency=False, order=True):
+    def __init__(self, crossword, ppb=32, solution=None, transparency=False, order=True, seed=None):
         """-- ppb Pixel per box (Default: 32)
         -- solution A string representing the solution (e.g. "Hallo"). 
         Each letter of that string will be marked on the crossword grid
         as an colored field
         -- transparency Should the image bg be transparend?
         -- order
+        -- seed Seed for picking the solution fields and the like 
+        (Default: the seed of the crossword)
         """
         
         self.crossword = crossword
         self.ppb = ppb
+        if seed is None:
+            seed = crossword.seed
+        self.random = random.Random(seed)
+        
+        ## Time the output of profiled crosswords
+        if crossword.profile is not None:
+            for name in ("get_crossword_html_grid", "get_wordfind_ascii_grid", "get_shuffled_word_list", "get_crossword_ascii_cues", "get_crossword_ascii_grid", "get_crossword_image_grid"):
+                setattr(self, name, crossword.profile.timed("rendering", getattr(self, name)))
 
         if order:
             self.crossword._number_words()
@@ -262,7 +1055,7 @@ class CrossWordFormatter(object):
             self.colors["highlight"] = self.highlight_colors[self.current_highlight_color]
         except IndexError:
             print("Generating random highlight color - please add additional highlight colors")
-            self.colors["highlight"] = (random.randint(0,255),random.randint(0,255),random.randint(0,255), 128)
+            self.colors["highlight"] = (self.random.randint(0,255),self.random.randint(0,255),self.random.randint(0,255), 128)
 
     def get_crossword_html_grid(self, filename):
         """Writes an html file
@@ -270,10 +1063,7 @@ class CrossWordFormatter(object):
         todo: Add solved-switch
         """
 
-
-        for word in self.crossword.placed_words:
-            self.crossword._write_cell(word.col, word.row, word.number)
-        
+        numbers = self._get_numbers()
         
         html = """<html>
         <head>
@@ -287,11 +1077,11 @@ class CrossWordFormatter(object):
                 
             
         html += "<table>"
-        for row in range(self.crossword.rows):
+        for row, cells in enumerate(self.crossword._get_rows()):
             html += "<tr>"
-            for cell in self.crossword.grid[row]:
-                if isinstance(cell, int):
-                    html += "<td id=\"box\"><small>%s</small></td>" % cell
+            for col, cell in enumerate(cells):
+                if (col+1, row+1) in numbers:
+                    html += "<td id=\"box\"><small>%s</small></td>" % numbers[(col+1, row+1)]
                 elif cell == self.crossword.empty:
                     html += "<td>%s</td>" % cell
                 else :
@@ -299,12 +1089,15 @@ class CrossWordFormatter(object):
             html += "</tr>"
         html += "</table></body></html>"
 
-        for word in self.crossword.placed_words:
-            self.crossword._write_cell(word.col, word.row, word.word[0])
-
         with open(filename, "w") as fh:
             fh.write(html)     
         return html
+
+    def _get_numbers(self):
+        """Returns a dict mapping the first cell (col, row) of each placed
+        word to the word's number"""
+
+        return dict(((word.col, word.row), word.number) for word in self.crossword.placed_words)
     
     def _set_solution(self, solution):
         """Checks if enough letters are available for the given solution
@@ -319,6 +1112,12 @@ class CrossWordFormatter(object):
         while "  " in solution:
             solution = solution.replace("  ", " ")
         
+        if isinstance(solution, unicode):
+            ## The letters on the grid are latin-1, see Word
+            try:
+                solution = solution.encode("latin-1")
+            except UnicodeEncodeError:
+                raise SolutionError("Cannot mark solution '%s': Its letters can't be on the grid" % solution.encode("utf-8"))
         self.solution = solution
         
         for letter in solution:
@@ -330,9 +1129,9 @@ class CrossWordFormatter(object):
             if solution.count(letter) > len(self.crossword.letters[letter]):
                 raise SolutionError("Your solution '%(solution)s' has %(num)i '%(letter)s' - there are not that much '%(letter)s's in your crosssword!" % {"num":solution.count(letter), "letter":letter, "solution":solution})
             
-            entry = random.choice(self.crossword.letters[letter])
+            entry = self.random.choice(self.crossword.letters[letter])
             while entry in self.solution_letters:
-                entry = random.choice(self.crossword.letters[letter])
+                entry = self.random.choice(self.crossword.letters[letter])
                 
             self.solution_letters[entry] = highlight_color_number
             col,row = entry
@@ -346,10 +1145,10 @@ class CrossWordFormatter(object):
             printstr = ""
         
         outStr = ""
-        for r in range(self.crossword.rows):
-            for c in self.crossword.grid[r]:
+        for cells in self.crossword._get_rows():
+            for c in cells:
                 if c == self.crossword.empty:
-                    outStr += '%s%s' % (string.lowercase[random.randint(0,len(string.lowercase)-1)], printstr)
+                    outStr += '%s%s' % (string.lowercase[self.random.randint(0,len(string.lowercase)-1)], printstr)
                 else:
                     outStr += '%s%s' % (c, printstr)
             outStr += '\n'
@@ -360,7 +1159,7 @@ class CrossWordFormatter(object):
         
         outStr = ''
         tmplist = copy.duplicate(self.crossword.placed_words)
-        random.shuffle(tmplist) # randomize word list
+        self.random.shuffle(tmplist) # randomize word list
         for word in tmplist:
             outStr += '%s\n' % word.word
         return outStr
@@ -391,22 +1190,20 @@ class CrossWordFormatter(object):
 
         outStr = ""
  
+        ## Numbers are only overlayed on the output, the grid itself
+        # always holds the letters
+        if solved:
+            numbers = {}
+        else:
+            numbers = self._get_numbers()
  
-        if not solved: 
-            for word in self.crossword.placed_words:
-                self.crossword._write_cell(word.col, word.row, word.number)
- 
-        for r in range(self.crossword.rows):
-            for c in self.crossword.grid[r]:
-                outStr += '%s%s' % (c, printstr)
+        empty = self.crossword.empty
+        for row, cells in enumerate(self.crossword._get_rows()):
+            for col, c in enumerate(cells):
+                if not solved and c != empty:
+                    c = "_"
+                outStr += '%s%s' % (numbers.get((col+1, row+1), c), printstr)
             outStr += '\n'
-            
-        if not solved:
-            for word in self.crossword.placed_words:
-                self.crossword._write_cell(word.col, word.row, word.word[0])
- 
-        if not solved:
-            outStr = re.sub(r'[a-z]', '_', outStr)
         return outStr
         
     def get_crossword_image_grid(self, output, solved=False):
@@ -465,9 +1262,8 @@ class CrossWordFormatter(object):
 
         ## ---------
         ## Draw grid
-        for col in range(self.crossword.cols):
-            row = 0
-            for cell in self.crossword.grid[col]:
+        for row, cells in enumerate(self.crossword._get_rows()):
+            for col, cell in enumerate(cells):
                 if not cell == self.crossword.empty:
                     if (col+1, row+1) in self.solution_letters:
                         fill_color = self.highlight_colors[self.solution_letters[(col+1, row+1)]] 
@@ -475,7 +1271,6 @@ class CrossWordFormatter(object):
                     else:
                         fill_color = self.colors["bg-box"]
                     draw.rectangle([col*self.ppb, row*self.ppb, (col+1)*self.ppb, (row+1)*self.ppb], outline=self.colors["grid"], fill=fill_color)
-                row += 1
         if self.solution:
             highlight_color = 0
             for col, row in solution_coords:
@@ -563,58 +1358,622 @@ def wordlist_from_string(str, get_crossword_solution_delimiter="/", question_del
     
     return wordlist
     
-def multiple_crosswords(cols, rows, empty = "-", maxloops=2000, wordlist=[], num=10, time_permitted=2.0, best_of=10, force_solved=False):
+def multiple_crosswords(cols, rows, empty = "-", maxloops=2000, wordlist=[], num=10, time_permitted=None, best_of=10, force_solved=False, workers=1, ordered=True, max_pending=None, engine="python", seed=None):
     """Creates a lot of crosswords.
     
     First this was a common function that sorted the crosswords by score 
     and returned them in a list.
     Now this is a generator return a tuple (crossword, score). You have
-    to do the sorting by your own."""
-    crosswords = []
+    to do the sorting by your own.
+    
+    -- time_permitted: Seconds the whole generator may take (Default: 
+        None = no limit). When the time is up, the crossword being 
+        computed gets the best result so far and no more crosswords are
+        yielded. Raises TimeOutError if not a single crossword could be 
+        computed in time.
+    -- workers: Number of processes to compute the crosswords in 
+        (Default: 1 = no extra processes)
+    -- ordered: Only with workers. Yield the crosswords in the order they
+        were started (True) or as soon as they are done (False)
+    -- max_pending: Only with workers. Number of crosswords which may be
+        computed ahead of the consumer (Default: 2*workers)
+    -- engine: The placement engine, see CrossWord
+    -- seed: The n-th crossword will be computed with the seed derived 
+        from this one and n - no matter how many workers are used.
+        (Default: None = random)
+    """
+    
+    if seed is None:
+        seed = random.randrange(sys.maxint)
+    
+    if time_permitted is not None:
+        deadline = time.time() + time_permitted
+    else:
+        deadline = None
+    
+    if workers > 1:
+        for cross, score in _parallel_crosswords(cols, rows, empty, maxloops, wordlist, num, deadline, best_of, force_solved, workers, ordered, max_pending, engine, seed):
+            yield cross, score
+        return
     
     for i in range(0,num):
-        cross = CrossWord(cols, rows, empty, maxloops, wordlist)
-        score = cross.compute_crossword(best_of=best_of, force_solved=force_solved)
-        crosswords.append((cross, score))
+        if deadline is None:
+            time_limit = None
+        elif time.time() < deadline:
+            time_limit = deadline - time.time()
+        elif i == 0:
+            raise TimeOutError("Could not compute a crossword within the permitted time")
+        else:
+            break
+        cross = CrossWord(cols, rows, empty, maxloops, wordlist, engine=engine, seed=_derive_seed(seed, i))
+        try:
+            score = cross.compute_crossword(best_of=best_of, force_solved=force_solved, time_limit=time_limit)
+        except TimeOutError:
+            if i == 0:
+                raise
+            break
         yield cross, score
-    #~ 
-    #~ ## Sort by score
-    #~ crosswords.sort(key=lambda i: i[1], reverse=True) # sort by score
-    #~ return crosswords[0]
 
-class CrossWord(object):
-    """The crossword objects represents a crossword"""
+def _parallel_crosswords(cols, rows, empty, maxloops, wordlist, num, deadline, best_of, force_solved, workers, ordered, max_pending, engine, seed):
+    """The process pool part of multiple_crosswords. 
+    
+    At most max_pending crosswords are submitted but not yet yielded, so
+    neither the pool's queue nor the memory grows with num. With a 
+    deadline, crosswords which are not back a second after it are given
+    up on."""
+    
+    if max_pending is None:
+        max_pending = 2*workers
+    
+    pool = multiprocessing.Pool(workers)
+    pending = collections.deque()
+    done = Queue.Queue()
+    submitted = 0
+    yielded = 0
+    
+    try:
+        while submitted < num or pending:
+            while submitted < num and len(pending) < max_pending:
+                if deadline is not None and time.time() >= deadline:
+                    ## Time is up: Just collect what is still pending
+                    num = submitted
+                    break
+                args = (cols, rows, empty, maxloops, wordlist, engine, 2, best_of, force_solved, deadline, _derive_seed(seed, submitted), 0, ("greedy", None, None))
+                if ordered:
+                    pending.append(pool.apply_async(_crossword_worker, (args,)))
+                else:
+                    pending.append(pool.apply_async(_crossword_worker, (args,), callback=done.put))
+                submitted += 1
+            
+            if not pending:
+                break
+            ## A little extra time for the workers to hand back their
+            # best crossword - if they don't, one may have died
+            if deadline is None:
+                timeout = None
+            else:
+                timeout = max(deadline - time.time(), 0) + 1
+            try:
+                if ordered:
+                    success, result = pending.popleft().get(timeout)
+                else:
+                    success, result = done.get(timeout=timeout)
+                    pending.popleft()
+            except (multiprocessing.TimeoutError, Queue.Empty):
+                logging.warning("The workers did not hand back all crosswords in time")
+                break
+            
+            if not success:
+                raise result
+            if result is None:
+                ## This one ran out of time
+                continue
+            
+            placements, score, counter, crossword_seed, best_round = result
+            cross = CrossWord(cols, rows, empty, maxloops, wordlist, engine=engine, seed=crossword_seed)
+            cross._restore([(cross._words[i], col, row, vertical) for i, col, row, vertical in placements])
+            cross.counter = counter
+            cross.score = score
+            cross.best_round = best_round
+            yielded += 1
+            yield cross, score
+        
+        if not yielded:
+            raise TimeOutError("Could not compute a crossword within the permitted time")
+    finally:
+        pool.terminate()
 
-    def __init__(self, cols, rows, empty = '_', maxloops = 2000, wordlist=[], reduce=None):       
-        """Initialize the crossword. Notice: This will also be used to create
-        a copy of the original crossword. For this reason there is some
-        wordlist-"magic" in here."""
+def fit_crossword(wordlist, empty="-", maxloops=2000, rounds=2, best_of=3, time_limit=None, seed=None, workers=1, engine="python", cache=None, search="greedy", beam_width=8, beam_expand=3, profile=None):
+    """Compute a crossword on the smallest square grid all words fit into.
+    The result is cropped to the rectangle the words actually use.
+    
+    The search starts with the size CrossWord picks for "auto" and grows
+    the grid until all words fit. From then on it is a binary search 
+    between the size no grid can be smaller than and the longer side of
+    the best crossword so far - a crossword found on a big grid often
+    fits into a much smaller one already.
+    
+    -- time_limit: Time budget of the whole search. When it is used up
+        the best crossword so far is returned. Raises TimeOutError if
+        not a single crossword was computed in time.
+    -- profile: A Profile (or True) shared by all the grids tried
+    -- The other options are passed to CrossWord and compute_crossword.
+    
+    Returns the crossword and its score. Words which could not be placed
+    on any grid (e.g. as they share no letter with any other word) are 
+    missing on the crossword, just as with compute_crossword.
+    """
+    
+    if seed is None:
+        seed = random.randrange(sys.maxint)
+    if time_limit is not None:
+        deadline = time.time() + time_limit
+    else:
+        deadline = None
+    
+    if profile is True:
+        profile = Profile()
+    auto = CrossWord("auto", "auto", empty, maxloops, wordlist, engine=engine, seed=seed, profile=profile)
+    lengths = [word.length for word in auto._words]
+    
+    ## No word may be longer than the grid, and each cell holds letters
+    # of two words at most
+    low = max(max(lengths), int(math.ceil(math.sqrt(sum(lengths)/2.0))))
+    high = None
+    
+    best = None
+    counter = 0
+    size = max(auto.cols, auto.rows, low)
+    while high is None or low < high:
+        if deadline is None:
+            remaining = None
+        elif time.time() < deadline:
+            remaining = deadline - time.time()
+        else:
+            break
         
-        if len(wordlist) < 3:
-            raise WordListError("Need at least 3 entries!")
+        cross = CrossWord(size, size, empty, maxloops, wordlist, engine=engine, seed=seed, profile=profile)
+        try:
+            cross.compute_crossword(rounds=rounds, best_of=best_of, workers=workers, time_limit=remaining, cache=cache, search=search, beam_width=beam_width, beam_expand=beam_expand)
+        except TimeOutError:
+            break
+        counter += cross.counter
+        logging.debug("Grid size %i: %i out of %i words" % (size, len(cross.placed_words), len(lengths)))
+        
+        if len(cross.placed_words) == len(lengths):
+            best = cross
+            min_col, min_row, max_col, max_row = cross._get_bounding_box()
+            high = max(max_col-min_col, max_row-min_row) + 1
+        else:
+            if best is None or _is_better(len(cross.placed_words), cross.score, len(best.placed_words), best.score):
+                best = cross
+            low = size + 1
+            if high is None and size >= sum(lengths):
+                ## The words can't be put together at all
+                break
+        
+        if high is None:
+            size = size*3//2
+        else:
+            size = (low + high) // 2
+    
+    if best is None:
+        raise TimeOutError("Could not compute a crossword within %g seconds" % time_limit)
+    
+    cropped = best.crop()
+    cropped.counter = counter
+    return cropped, cropped.score
 
-        if cols =="auto" or rows == "auto":
-            if wordlist != [] and isinstance(wordlist[0], tuple):
-                longest = max(wordlist, key=lambda i: len(i[0]))[0]
-                average = sum([len(w[0]) for w in wordlist])/len(wordlist)
-            #~ elif isinstance(wordlist[0], str):
-                #~ longest = max(wordlist, key=lambda i: len(i))
-                #~ average = sum(wordlist)/len(wordlist)
-            elif wordlist != []:
-                print type(wordlist[0])
-                raise WordListError("Wordlist must contain strings or tuples!")
-            min_length = len(longest)
-            #~ if not reduce:
-            logging.debug("'%s': %i - Average: %i" % (longest, min_length, average))
+def check_engines(wordlist, cols="auto", rows="auto", engines=None, seeds=range(10), best_of=3, search="greedy"):
+    """Compare the placement engines: For each seed a crossword is 
+    computed with each engine and compared with the one of the first 
+    engine. Engines which agree on every board give the same crosswords.
+    
+    -- engines: Names of the engines to compare (Default: all of ENGINES,
+        "python" first). Engines which can't be used here (e.g. "numpy"
+        without numpy) are left out with a warning.
+    
+    Returns the list of (seed, engine) of the crosswords which differ 
+    from the one of the first engine."""
+    
+    if engines is None:
+        engines = sorted(ENGINES, key=lambda name: (name != "python", name))
+    available = []
+    for name in engines:
+        try:
+            CrossWord(cols, rows, "-", 2000, wordlist, engine=name)
+        except ImportError, inst:
+            logging.warning("Leaving out engine '%s': %s" % (name, inst))
+            continue
+        available.append(name)
+    
+    mismatches = []
+    for seed in seeds:
+        reference = None
+        for name in available:
+            cross = CrossWord(cols, rows, "-", 2000, wordlist, engine=name, seed=seed)
+            score = cross.compute_crossword(best_of=best_of, search=search)
+            layout = score, sorted((cross._index[p.entry], p.col, p.row, bool(p.vertical)) for p in cross.placed_words)
+            if reference is None:
+                reference = layout
+            elif layout != reference:
+                mismatches.append((seed, name))
+    return mismatches
+
+def _is_better(num_placed, score, best_num_placed, best_score):
+    """The rule for picking the best crossword: More placed words first,
+    then the score. On a tie, the newer crossword wins."""
+    
+    return (num_placed >= best_num_placed and score >= best_score) or num_placed > best_num_placed
+
+def _derive_seed(seed, index):
+    """The seed for the index-th round (or crossword) of a computation
+    with the given seed"""
+    
+    return (seed << 32) + index
+
+def _compute_worker(args):
+    """Run some rounds of compute_crossword in a worker process
+    
+    Returns the winning layout as a list of (index, col, row, vertical) -
+    index being the position of the word in the given entries -, its
+    score, the number of rounds run, the seed and the winning round.
+    Returns None if no acceptable crossword was found before the deadline
+    (a time.time() value)."""
+    
+    cols, rows, empty, maxloops, entries, engine, rounds, best_of, force_solved, deadline, seed, first_round, search = args
+    
+    ## The task may have been waiting in the pool's queue for a while
+    if deadline is None:
+        time_limit = None
+    else:
+        time_limit = deadline - time.time()
+        if time_limit <= 0:
+            return None
+    
+    cross = CrossWord(cols, rows, empty, maxloops, entries, engine=engine, seed=seed)
+    try:
+        score = cross.compute_crossword(rounds=rounds, best_of=best_of, force_solved=force_solved, time_limit=time_limit, first_round=first_round, search=search[0], beam_width=search[1], beam_expand=search[2])
+    except TimeOutError:
+        return None
+    
+    placements = [(cross._index[p.entry], p.col, p.row, p.vertical) for p in cross.placed_words]
+    return placements, score, cross.counter, seed, cross.best_round
+
+def _crossword_worker(args):
+    """Like _compute_worker, but errors are handed back to the parent as
+    well. Returns (True, result) or (False, exception)."""
+    
+    try:
+        return True, _compute_worker(args)
+    except Exception, inst:
+        return False, inst
+
+def reserve_output(base, extension=".png"):
+    """Claim a new file 'base.png' (or 'base_1.png', 'base_2.png', ...,
+    if it exists) and return its name. The file is created right away, so
+    processes running at the same time never get the same name."""
+    
+    name = "%s%s" % (base, extension)
+    c = 1
+    while True:
+        try:
+            os.close(os.open(name, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0666))
+            return name
+        except OSError, inst:
+            if inst.errno != errno.EEXIST:
+                raise
+        name = "%s_%i%s" % (base, c, extension)
+        c += 1
+
+def batch_crosswords(inputfiles, workers=1, output=None, create_image=True, solved=False, ppb=32, solution=None, cols="auto", rows="auto", fit=False, best_of=3, time_limit=None, seed=None, engine="python", search="greedy", beam_width=8, beam_expand=3, cache=None, cache_size=10*1024*1024):
+    """Compute a crossword for each of the given .cwf files and render it
+    to an image, spread over a pool of workers processes (one file per 
+    process at a time). Yields a BatchResult for each file as soon as it 
+    is done - so not necessarily in the given order. A file which fails 
+    doesn't stop the others, its error is in the BatchResult.
+    
+    -- output: Directory to write the images to (Default: next to the
+        input files). Other values are used as base name of all images.
+    -- cache: Directory of a ResultCache shared by the workers
+    The other options are those of CrossWord.compute_crossword, 
+    fit_crossword and CrossWordFormatter.
+    """
+    
+    settings = dict(output=output, create_image=create_image, solved=solved, ppb=ppb, solution=solution, cols=cols, rows=rows, fit=fit, best_of=best_of, time_limit=time_limit, seed=seed, engine=engine, search=search, beam_width=beam_width, beam_expand=beam_expand, cache=cache, cache_size=cache_size)
+    tasks = [(inputfile, settings) for inputfile in inputfiles]
+    
+    if workers <= 1:
+        for task in tasks:
+            yield _batch_worker(task)
+        return
+    
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(_batch_worker, tasks):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _batch_worker(args):
+    """Compute and render the crossword of one file for batch_crosswords"""
+    
+    inputfile, settings = args
+    output = None
+    parse_time = compute_time = render_time = 0.0
+    num_placed = num_words = score = 0
+    try:
+        start = time.time()
+        parser = SimpleParser(inputfile)
+        wordlist = parser.get_questions()
+        solution = settings["solution"]
+        if solution is None and parser.has_option("solution"):
+            solution = parser.get_option("solution")
+        parse_time = time.time() - start
         
-            size = int(((average*len(wordlist)*4)**0.5))
-            if len(wordlist) > 75:
-                size = int(size*0.8)
-            #~ if reduce:
-                #~ size = int(size*reduce)
-            while size <= min_length:
-                size += 1
-                
+        start = time.time()
+        if settings["cache"]:
+            cache = ResultCache(settings["cache"], settings["cache_size"])
+        else:
+            cache = None
+        if settings["fit"]:
+            cwd, score = fit_crossword(wordlist, " ", 5000, best_of=settings["best_of"], time_limit=settings["time_limit"], seed=settings["seed"], engine=settings["engine"], cache=cache, search=settings["search"], beam_width=settings["beam_width"], beam_expand=settings["beam_expand"])
+        else:
+            cwd = CrossWord(settings["cols"], settings["rows"], " ", 5000, wordlist, engine=settings["engine"])
+            score = cwd.compute_crossword(best_of=settings["best_of"], time_limit=settings["time_limit"], seed=settings["seed"], cache=cache, search=settings["search"], beam_width=settings["beam_width"], beam_expand=settings["beam_expand"])
+        num_placed, num_words = len(cwd.placed_words), len(cwd.wordlist)
+        compute_time = time.time() - start
+        
+        if settings["create_image"]:
+            start = time.time()
+            name = os.path.splitext(os.path.basename(inputfile))[0]
+            if settings["output"] is None:
+                base = os.path.join(os.path.dirname(inputfile), name)
+            elif os.path.isdir(settings["output"]):
+                base = os.path.join(settings["output"], name)
+            else:
+                base = os.path.splitext(settings["output"])[0]
+            output = reserve_output(base)
+            formatter = CrossWordFormatter(cwd, ppb=settings["ppb"], solution=solution)
+            formatter.get_crossword_image_grid(output=output)
+            if settings["solved"]:
+                formatter.get_crossword_image_grid(output=output.replace(".png", "_solved.png"), solved=True)
+            render_time = time.time() - start
+    except Exception, inst:
+        ## Don't leave an empty image behind
+        if output is not None and os.path.exists(output) and os.path.getsize(output) == 0:
+            os.remove(output)
+        return BatchResult(inputfile, None, num_placed, num_words, score, parse_time, compute_time, render_time, "%s: %s" % (inst.__class__.__name__, inst))
+    return BatchResult(inputfile, output, num_placed, num_words, score, parse_time, compute_time, render_time, None)
+
+class Profile(object):
+    """Counters and timings of the crosswords computed with it, see 
+    CrossWord(profile=...). One profile may be shared by several 
+    crosswords (as fit_crossword does), their numbers add up.
+    
+    -- score_calls: Placements scored by CrossWord._get_score. The 
+        "numpy" engine scores all placements of a word at once, so with
+        it this only counts the first word of each round.
+    -- rejections: Placements turned down, by reason: "bounds" (the 
+        word leaves the grid - the "python" engine drops those before
+        scoring them), "mismatch" (a cell holds another letter), 
+        "neighbour" (letters next to the word) and "collinear" (the 
+        word would overlap a word of its direction)
+    -- candidates: Places found for each word, all rounds together
+    -- lookups: Number of times places were searched for a word
+    -- rounds, pruned_rounds, timed_out_rounds: Rounds run, given up as
+        they couldn't beat the best one, and stopped by the time limit
+    -- phases: Seconds spent on "setup" (CrossWord()), "placement" (the
+        rounds), "numbering" and "rendering" (CrossWordFormatter output)
+    
+    Rounds computed by worker processes (workers > 1) are not counted.
+    """
+    
+    REJECTIONS = ("bounds", "mismatch", "neighbour", "collinear")
+    PHASES = ("setup", "placement", "numbering", "rendering")
+    
+    def __init__(self):
+        self.score_calls = 0
+        self.rejections = dict.fromkeys(self.REJECTIONS, 0)
+        self.candidates = {}
+        self.lookups = 0
+        self.rounds = 0
+        self.pruned_rounds = 0
+        self.timed_out_rounds = 0
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+    
+    def timed(self, phase, function):
+        """Returns a version of function which adds the time it takes to
+        the given phase"""
+        
+        def timed_function(*args, **kwargs):
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.phases[phase] += time.time() - start
+        return timed_function
+    
+    def as_dict(self):
+        """All numbers as a dict - ready for json.dumps"""
+        
+        return dict(
+            score_calls=self.score_calls, 
+            rejections=dict(self.rejections), 
+            candidates=dict(lookups=self.lookups, total=sum(self.candidates.itervalues()), per_word=dict(self.candidates)),
+            rounds=dict(run=self.rounds, pruned=self.pruned_rounds, timed_out=self.timed_out_rounds),
+            phases=dict(self.phases))
+
+class ResultCache(object):
+    """An on-disk cache of computed crosswords
+    
+    Each crossword is stored as a small JSON file in the cache directory,
+    named by its key. Entries are written to a temporary file first and
+    renamed afterwards, so several processes can share a directory 
+    without ever reading half written entries. Reading an entry touches
+    its file - when the directory grows beyond max_size bytes, the least
+    recently used entries are removed."""
+    
+    ## Part of every key - change it if the generator would compute
+    # another crossword for the same input
+    version = 1
+    
+    def __init__(self, directory, max_size=10*1024*1024):
+        self.directory = directory
+        self.max_size = max_size
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    
+    def get_key(self, crossword, rounds, best_of, force_solved, first_round, search=("greedy", None, None)):
+        """Hash everything the result of compute_crossword depends on. 
+        Words are compared as CrossWord stores them (lower case, no 
+        whitespace), in the given order."""
+        
+        words = [(word.word, word.clue) for word in crossword._words]
+        if search[0] == "greedy":
+            search = search[:1]
+        settings = (self.version, crossword.cols, crossword.rows, crossword.maxloops, rounds, best_of, bool(force_solved), crossword.seed, first_round, tuple(search), words)
+        return hashlib.sha1(repr(settings)).hexdigest()
+    
+    def _get_path(self, key):
+        return os.path.join(self.directory, "%s.json" % key)
+    
+    def load(self, key, crossword):
+        """Put the cached crossword for key onto the grid of the given
+        crossword. Returns False if there is no such entry."""
+        
+        path = self._get_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path, None)
+        except (IOError, OSError):
+            return False
+        except ValueError:
+            logging.warning("Removing broken cache entry %s" % path)
+            self._remove(path)
+            return False
+        
+        crossword._restore([(crossword._words[i], col, row, vertical) for i, col, row, vertical in entry["placements"]])
+        crossword.score = entry["score"]
+        crossword.counter = entry["counter"]
+        crossword.best_round = entry["best_round"]
+        return True
+    
+    def store(self, key, crossword):
+        """Store the crossword as it is on the grid now"""
+        
+        entry = {
+            "placements": [(crossword._index[p.entry], p.col, p.row, p.vertical) for p in crossword.placed_words],
+            "score": crossword.score,
+            "counter": crossword.counter,
+            "best_round": crossword.best_round,
+        }
+        
+        handle, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "w") as f:
+                json.dump(entry, f)
+            os.rename(tmp_path, self._get_path(key))
+        except:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+    
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits
+        into max_size"""
+        
+        entries = []
+        size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                ## Removed by another process in the meantime
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+            size += stat.st_size
+        
+        entries.sort()
+        for mtime, path, entry_size in entries:
+            if size <= self.max_size:
+                break
+            self._remove(path)
+            size -= entry_size
+    
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class CrossWord(object):
+    """The crossword objects represents a crossword"""
+    
+    ## Returned by _compute_round for rounds which were given up
+    _PRUNED = -1
+
+    def __init__(self, cols, rows, empty = '_', maxloops = 2000, wordlist=[], reduce=None, engine="python", seed=None, profile=None):       
+        """Initialize the crossword. Notice: This will also be used to create
+        a copy of the original crossword. For this reason there is some
+        wordlist-"magic" in here.
+        
+        -- engine: Name of the PlacementEngine which finds the places for
+            the words, see ENGINES. "python" scores each possible 
+            placement on its own, "numpy" scores all placements of a 
+            word at once (needs numpy)
+        -- seed: An integer, see compute_crossword (Default: None = random)
+        -- wordlist: (answer, clue) tuples, Words or a CompiledBank
+        -- profile: A Profile to count and time what the crossword does 
+            in, or True for a new one. It is kept in self.profile. 
+            (Default: None = nothing is counted, at no cost at all)
+        """
+        
+        start = time.time()
+        if profile is True:
+            profile = Profile()
+        self.profile = profile
+        
+        if isinstance(wordlist, CompiledBank):
+            wordlist = wordlist.get_questions()
+        
+        if len(wordlist) < 3:
+            raise WordListError("Need at least 3 entries!")
+
+        if cols =="auto" or rows == "auto":
+            if wordlist != [] and isinstance(wordlist[0], tuple):
+                longest = max(wordlist, key=lambda i: len(i[0]))[0]
+                average = sum([len(w[0]) for w in wordlist])/len(wordlist)
+            elif wordlist != [] and isinstance(wordlist[0], Word):
+                longest = max(wordlist, key=lambda i: i.length).word
+                average = sum([w.length for w in wordlist])/len(wordlist)
+            #~ elif isinstance(wordlist[0], str):
+                #~ longest = max(wordlist, key=lambda i: len(i))
+                #~ average = sum(wordlist)/len(wordlist)
+            elif wordlist != []:
+                print type(wordlist[0])
+                raise WordListError("Wordlist must contain strings or tuples!")
+            min_length = len(longest)
+            #~ if not reduce:
+            logging.debug("'%s': %i - Average: %i" % (longest, min_length, average))
+        
+            size = int(((average*len(wordlist)*4)**0.5))
+            if len(wordlist) > 75:
+                size = int(size*0.8)
+            #~ if reduce:
+                #~ size = int(size*reduce)
+            while size <= min_length:
+                size += 1
+                
         if cols == "auto":
             cols = size
         if rows == "auto":
@@ -628,42 +1987,168 @@ class CrossWord(object):
         self.wordlist = wordlist
         self.placed_words = []
         self.counter = 0
+        
+        ## All the randomness of the generator comes from self._random. 
+        # Each round gets a new one, seeded from self.seed.
+        self.seed = seed
+        self.best_round = None
+        self._random = random.Random(seed)
+        
+        try:
+            engine_class = ENGINES[engine]
+        except KeyError:
+            raise ValueError("Unknown engine '%s'" % engine)
+        self.engine = engine
+        self._engine = engine_class(self)
         self._setup_grid_and_letters()
+        self._setup_wordlist()
         
         self.score = -1
         
+        if profile is not None:
+            self._install_profile()
+            profile.phases["setup"] += time.time() - start
+    
+    def _install_profile(self):
+        """Shadow the methods self.profile looks at with counting versions
+        of them. Crosswords without a profile keep the plain methods."""
+        
+        profile = self.profile
+        get_score = self._get_score
+        get_possible_coords = self._get_possible_coords
+        
+        def _get_score(col, row, vertical, word):
+            profile.score_calls += 1
+            score = get_score(col, row, vertical, word)
+            if not score:
+                profile.rejections[self._get_rejection(col, row, vertical, word)] += 1
+            return score
+        
+        def _get_possible_coords(word):
+            coordlist = get_possible_coords(word)
+            profile.lookups += 1
+            profile.candidates[word.word] = profile.candidates.get(word.word, 0) + len(coordlist)
+            return coordlist
+        
+        def counted(compute_round):
+            compute_round = profile.timed("placement", compute_round)
+            def counted_round(*args, **kwargs):
+                score = compute_round(*args, **kwargs)
+                profile.rounds += 1
+                if score is None:
+                    profile.timed_out_rounds += 1
+                elif score == self._PRUNED:
+                    profile.pruned_rounds += 1
+                return score
+            return counted_round
+        
+        self._get_score = _get_score
+        self._get_possible_coords = _get_possible_coords
+        self._compute_round = counted(self._compute_round)
+        self._compute_beam_round = counted(self._compute_beam_round)
+        self._number_words = profile.timed("numbering", self._number_words)
+        
     def _setup_grid_and_letters(self):
         """Initialize / clear grid and letters"""
         
-        ## Create the grid and fill it with empty letters
-        self.grid = []
-        for i in range(self.cols):
-            col = []
-            for j in range(self.rows):
-                col.append(self.empty)
-            self.grid.append(col)
-        
-        ## Create our letter-dict
-        self.letters = {}
-        for letter in string.lowercase: self.letters[letter]=[]
-        ## In "double" we'll put those coords which already are used
-        # by two words (cross). So we do not check coords, that are already
-        # occupied.
-        self.letters["double"]=[]
-        
-        ## Sort the wordlist by length. Words with same length will be
-        # shuffled in order.
-        tmplist = []
+        ## Create the grid: One flat bytearray, row by row, surrounded by
+        # a border of BORDER_CELLs. Cell (col, row) lives at
+        # row*width + col, so neighbour lookups never leave the array
+        # and no bounds checks are needed.
+        self._width = self.cols + 2
+        border = bytearray([BORDER_CELL])
+        line = border + bytearray(self.cols) + border
+        self.grid = border*self._width + line*self.rows + border*self._width
+        
+        ## The flags of each cell, laid out just like the grid. With them
+        # a placement is checked with one look at each cell it covers.
+        self.flags = bytearray(len(self.grid))
+
+        ## Create our anchor index: For each letter it maps the grid
+        # position of every cell a crossing word could still go through
+        # to (col, row, vertical) - vertical being the direction of that
+        # crossing word. Cells already used by two words (cross) or
+        # blocked by their neighbours are not in here, so we do not
+        # check them over and over again.
+        self.anchors = {}
+        self._letters = None
+        
+        ## Every cell written to the grid is recorded in the journal, so
+        # a round can be undone without rebuilding the grid.
+        self._journal = []
+    
+    def _setup_wordlist(self):
+        """Create the Word objects and group them by length. This is 
+        done once - the rounds just shuffle the groups. Word objects 
+        in the given list are used as they are."""
+        
+        self._words = []
         for word in self.wordlist:
-            if isinstance(word, Word):
-                tmplist.append(Word(word.word, word.clue))
-            else:
-                tmplist.append(Word(word[0], word[1]))
-        random.shuffle(tmplist)
-        tmplist.sort(key=lambda i: len(i.word), reverse=True)
-        self.wordlist = tmplist
+            if not isinstance(word, Word):
+                word = Word(word[0], word[1])
+            self._words.append(word)
+        self._index_words()
+        self._shuffle_wordlist()
+    
+    def _index_words(self):
+        """Build everything the rounds need to know about self._words"""
+        
+        groups = {}
+        for word in self._words:
+            groups.setdefault(word.length, []).append(word)
+        self._length_groups = [groups[length] for length in sorted(groups, reverse=True)]
+        
+        ## Placements refer to the position of their word in the list
+        self._index = dict((word, i) for i, word in enumerate(self._words))
+        
+        ## The best score a word could ever get: A letter can only be
+        # crossed if another word has it too, and two crosses can't be 
+        # next to each other.
+        num_words = {}
+        for word in self._words:
+            for letter in word.histogram:
+                num_words[letter] = num_words.get(letter, 0) + 1
+        self._max_scores = {}
+        for word in self._words:
+            crosses = run = 0
+            for letter in word.word:
+                if num_words[letter] > 1:
+                    run += 1
+                else:
+                    crosses += (run + 1) // 2
+                    run = 0
+            crosses += (run + 1) // 2
+            self._max_scores[word] = 1 + crosses
+    
+    def _shuffle_wordlist(self):
+        """Sort the wordlist by length. Words with same length will be
+        shuffled in order."""
+        
+        wordlist = []
+        for group in self._length_groups:
+            group = list(group)
+            self._random.shuffle(group)
+            wordlist.extend(group)
+        self.wordlist = wordlist
+    
+    def _rollback(self):
+        """Remove all placed words from the grid. This only touches
+        the cells written since the last rollback."""
+        
+        grid = self.grid
+        flags = self.flags
+        width = self._width
+        for pos in self._journal:
+            grid[pos] = EMPTY_CELL
+            ## Flags are only set on written cells and their neighbours
+            flags[pos] = flags[pos-1] = flags[pos+1] = flags[pos-width] = flags[pos+width] = 0
+        self._journal = []
+        
+        self.placed_words = []
+        self.anchors = {}
+        self._letters = None
  
-    def compute_crossword(self, rounds=2, best_of=3, force_solved=False):
+    def compute_crossword(self, rounds=2, best_of=3, force_solved=False, workers=1, time_limit=None, seed=None, first_round=0, cache=None, search="greedy", beam_width=8, beam_expand=3, callback=None):
         """Compute possible crosswords
         
         -- rounds: How often sould be tried to place a word? (Default: 2)
@@ -671,11 +2156,130 @@ class CrossWord(object):
             crossword with the best score (Default: 3)
         -- force_solved Generate grids until every word from the wordlists
             fits. (Default: False).
+        -- workers: Number of processes the best_of crosswords are spread
+            over (Default: 1 = no extra processes)
+        -- time_limit: Stop after that many seconds and keep the best 
+            crossword so far (Default: None = no limit). Raises 
+            TimeOutError if not a single crossword was completed in time
+            - or, with force_solved, if no solved one was found. In the 
+            latter case the best unsolved crossword is kept anyway.
+        -- seed: Round n is computed with the seed derived from this one 
+            and n. So the result does not depend on the number of workers,
+            and round n can be recomputed on its own by passing 
+            first_round=n and best_of=1. (Default: the seed given to 
+            CrossWord, or a random one). The seed used is stored in 
+            self.seed, the number of the winning round in self.best_round.
+        -- first_round: Number of the first round (Default: 0)
+        -- cache: A ResultCache. If a crossword was computed with the same
+            words, grid size, settings and seed before, it is taken from 
+            the cache instead. Only used with a seed - without one there 
+            is nothing to look up. Crosswords computed with a time_limit
+            are not stored, as they depend on the speed of the machine.
+        -- search: "greedy" puts each word at its best place right away,
+            "beam" keeps the beam_width best boards after each word and 
+            tries the beam_expand best places of the next word on each
+            of them. Slower per round, but it places more words on 
+            crowded grids. (Default: greedy)
+        -- callback: Called with a Progress each time a new best 
+            crossword was found (see _is_better - on a tie the newer one
+            wins), while that crossword is on the grid. Not called for 
+            crosswords from the cache.
+        """
+        
+        if search not in ("greedy", "beam"):
+            raise ValueError("Unknown search '%s'" % search)
+        search = (search, beam_width, beam_expand)
+        
+        if seed is None and self.seed is None:
+            cache = None
+        self._setup_seed(seed)
+        
+        if cache is not None:
+            key = cache.get_key(self, rounds, best_of, force_solved, first_round, search)
+            if cache.load(key, self):
+                return self.score
+        
+        if time_limit is not None:
+            deadline = time.time() + time_limit
+        else:
+            deadline = None
+        
+        if workers > 1:
+            score = self._compute_parallel(rounds, best_of, force_solved, workers, time_limit, deadline, first_round, search, callback)
+        else:
+            best_placements, best_score, best_round = None, 0, None
+            start = time.time()
+            for best_placements, best_score, best_round in self._iter_rounds(rounds, best_of, force_solved, deadline, first_round, search):
+                if callback is not None:
+                    callback(Progress(len(best_placements), best_score, best_round, time.time() - start))
+            score = self._finish(best_placements, best_score, best_round, force_solved, time_limit)
+        
+        if cache is not None and time_limit is None:
+            cache.store(key, self)
+        return score
+    
+    def compute_progressive(self, rounds=2, best_of=3, force_solved=False, time_limit=None, seed=None, first_round=0, search="greedy", beam_width=8, beam_expand=3):
+        """Like compute_crossword, but a generator: Each time a new best
+        crossword is found, a Progress (number of placed words, score, 
+        round and seconds since the start) is yielded - with that 
+        crossword on the grid, ready to be shown.
+        
+        Stop iterating as soon as the crossword is good enough. Either 
+        way the best crossword is on the grid afterwards. Nothing is 
+        yielded if no round was done within the time_limit. The rounds
+        are computed in this process, one after another.
+        
+            for progress in crossword.compute_progressive(best_of=100, time_limit=5):
+                show(crossword)
+                if progress.num_placed == len(crossword.wordlist):
+                    break
         """
         
-        copy = CrossWord(self.cols, self.rows, self.empty, self.maxloops, [(w.word, w.clue) for w in self.wordlist], reduce=reduce)
+        if search not in ("greedy", "beam"):
+            raise ValueError("Unknown search '%s'" % search)
+        search = (search, beam_width, beam_expand)
+        self._setup_seed(seed)
+        
+        start = time.time()
+        if time_limit is not None:
+            deadline = start + time_limit
+        else:
+            deadline = None
+        
+        best_placements, best_score, best_round = None, 0, None
+        try:
+            for best_placements, best_score, best_round in self._iter_rounds(rounds, best_of, force_solved, deadline, first_round, search):
+                yield Progress(len(best_placements), best_score, best_round, time.time() - start)
+        finally:
+            self._restore(best_placements or [])
+            self.score = best_score
+            self.best_round = best_round
+    
+    def _setup_seed(self, seed):
+        """Pick the seed for the rounds to come: The given one, the one 
+        of the crossword or a random one."""
+        
+        if seed is None:
+            seed = self.seed
+        if seed is None:
+            seed = random.randrange(sys.maxint)
+        self.seed = seed
+    
+    def _iter_rounds(self, rounds, best_of, force_solved, deadline, first_round, search):
+        """Compute the best_of rounds of compute_crossword one after 
+        another. search is (name, beam_width, beam_expand).
+        
+        Yields (placements, score, round) for each round which becomes 
+        the best one, while that round is still on the grid. placements is
+        a list of (word, col, row, vertical)."""
+        
+        seed = self.seed
         
+        ## The best round is kept as a list of (word, col, row, vertical)
+        # placements and written to the grid again in the end.
+        best_placements = None
         best_score = 0
+        best_round = None
         count = 0
 
         solved = False
@@ -683,33 +2287,35 @@ class CrossWord(object):
         while (count<=best_of-1 and not force_solved) or (force_solved and not solved):
             self.counter += 1
             logging.debug("Round %i" % count)
+            
+            self._random = random.Random(_derive_seed(seed, first_round + count))
+            if best_placements is None:
+                best = None
+            else:
+                best = (len(best_placements), best_score)
+            if search[0] == "beam":
+                score = self._compute_beam_round(rounds, search[1], search[2], deadline, best)
+            else:
+                score = self._compute_round(rounds, deadline, best)
+            if score is None:
+                logging.debug("Time is up in round %i" % count)
+                break
+            if score == self._PRUNED:
+                logging.debug("Round %i can't beat the best round" % count)
+                count += 1
+                if force_solved and count >= self.maxloops:
+                    raise MaxLoopError("Could not solve the crossword within %i tries" % self.maxloops)
+                continue
 
-            score = 0
-            copy.placed_words = []
-            copy._setup_grid_and_letters()
-
-            ## Try to fit all the words from the wordlist onto the grid
-            x = 1
-            while x < rounds:
-                for word in copy.wordlist:
-                    if word not in copy.placed_words:
-                        #~ raw_input()
-                        word_score = copy._place_word(word)
-                        score += word_score
-                x += 1
-
-            ## Check if the copy-crossword is "better" than the original. 
-            if (len(copy.placed_words) >= len(self.placed_words) and score >= best_score) or len(copy.placed_words) > len(self.placed_words):
-                self.placed_words = copy.placed_words
-                self.wordlist = copy.wordlist
-                self.grid = copy.grid
-                self.letters = copy.letters
-                self.cols = copy.cols
-                self.rows = copy.rows
+            ## Check if this round is "better" than the best one so far
+            if best_placements is None or _is_better(len(self.placed_words), score, len(best_placements), best_score):
+                best_placements = [(p.entry, p.col, p.row, p.vertical) for p in self.placed_words]
                 best_score = score
+                best_round = first_round + count
+                yield best_placements, best_score, best_round
             
             ## If all words are on the list the crossword ist "solved"
-            if len(copy.placed_words) == len(copy.wordlist):
+            if len(self.placed_words) == len(self.wordlist):
                 solved = True
             else:
                 solved = False
@@ -718,10 +2324,471 @@ class CrossWord(object):
             
             if force_solved and count >= self.maxloops:
                 raise MaxLoopError("Could not solve the crossword within %i tries" % self.maxloops)
+    
+    def _compute_round(self, rounds, deadline=None, best=None):
+        """Clear the grid and try to fit all the words from the wordlist
+        onto it. 
         
+        -- best: (number of placed words, score) of the best round so far.
+            The round is given up as soon as it can't beat that any more,
+            even if all the words left got placed with their best score.
+        
+        Returns the score - or None if the deadline was reached before the
+        round was done, or _PRUNED if it was given up."""
+        
+        score = 0
+        self._rollback()
+        self._shuffle_wordlist()
+        
+        ## Words which might still get placed and their best scores
+        open_words = len(self.wordlist)
+        max_scores = self._max_scores
+        open_score = sum(max_scores[word] for word in self.wordlist)
+
+        remaining = self.wordlist
+        x = 1
+        while x < rounds:
+            last_pass = x == rounds - 1
+            unplaced = []
+            for word in remaining:
+                if deadline is not None and time.time() > deadline:
+                    return None
+                num_placed = len(self.placed_words)
+                word_score = self._place_word(word)
+                score += word_score
+                if len(self.placed_words) == num_placed:
+                    unplaced.append(word)
+                    ## There is another chance in the next pass
+                    if not last_pass:
+                        continue
+                open_words -= 1
+                open_score -= max_scores[word]
+                if best is not None and not _is_better(len(self.placed_words) + open_words, score + open_score, best[0], best[1]):
+                    return self._PRUNED
+            remaining = unplaced
+            x += 1
+        return score
+    
+    def _compute_beam_round(self, rounds, beam_width, beam_expand, deadline=None, best=None):
+        """Like _compute_round, but instead of one board the beam_width
+        best boards are kept. Each word is tried at its beam_expand best
+        places on each of them, and the best boards of all those go on 
+        with the next word. Boards without a place for the word go on 
+        as they are. The words left out are tried again on the best 
+        board in the remaining rounds-2 passes.
+        
+        Returns the score just like _compute_round. The best board is on
+        the grid afterwards."""
+        
+        self._rollback()
+        self._shuffle_wordlist()
+        
+        max_scores = self._max_scores
+        open_words = len(self.wordlist)
+        open_score = sum(max_scores[word] for word in self.wordlist)
+        
+        ## A beam entry is (number of placed words, score, board, words
+        # left out), the best one first
+        beam = [(0, 0, self._get_board(), ())]
+        for word in self.wordlist:
+            if deadline is not None and time.time() > deadline:
+                return None
+            
+            ## Collect what could become of each board without changing
+            # it - only the boards which make it into the beam are built
+            candidates = []
+            for entry in beam:
+                num_placed, score, board, unplaced = entry
+                self._set_board(board, copy=False)
+                if not self.placed_words:
+                    candidates.append((1, 0, entry, None))
+                    continue
+                
+                seen = set()
+                for col, row, vertical, fit_score in self._get_possible_coords(word):
+                    if (col, row, vertical) in seen:
+                        continue
+                    seen.add((col, row, vertical))
+                    candidates.append((num_placed+1, score+fit_score, entry, (col, row, vertical, fit_score)))
+                    if len(seen) == beam_expand:
+                        break
+                if not seen:
+                    candidates.append((num_placed, score, entry, None))
+            
+            ## sort() is stable: On a tie the better board and the better
+            # place of the word win
+            candidates.sort(key=lambda candidate: (candidate[0], candidate[1]), reverse=True)
+            
+            new_beam = []
+            for num_placed, score, entry, placement in candidates[:beam_width]:
+                self._set_board(entry[2])
+                if num_placed == entry[0]:
+                    new_beam.append((num_placed, score, entry[2], entry[3] + (word,)))
+                    continue
+                if placement is None:
+                    self._place_word(word)
+                else:
+                    col, row, vertical, fit_score = placement
+                    self._write_word(col, row, vertical, word)
+                new_beam.append((num_placed, score, self._get_board(), entry[3]))
+            beam = new_beam
+            
+            open_words -= 1
+            open_score -= max_scores[word]
+            if best is not None and not self._beam_can_win(beam, open_words, open_score, rounds > 2, best):
+                return self._PRUNED
+        
+        num_placed, score, board, remaining = beam[0]
+        self._set_board(board)
+        x = 2
+        while x < rounds and remaining:
+            unplaced = []
+            for word in remaining:
+                if deadline is not None and time.time() > deadline:
+                    return None
+                num_placed = len(self.placed_words)
+                score += self._place_word(word)
+                if len(self.placed_words) == num_placed:
+                    unplaced.append(word)
+            remaining = unplaced
+            x += 1
+        return score
+    
+    def _beam_can_win(self, beam, open_words, open_score, retry, best):
+        """True if a board of the beam might still beat best, even if 
+        all the open words got placed with their best score. With retry
+        the words a board left out get another chance in later passes,
+        so they count as open words of that board."""
+        
+        if not retry:
+            ## The boards are ranked, so the first one gets furthest
+            return _is_better(beam[0][0] + open_words, beam[0][1] + open_score, best[0], best[1])
+        max_scores = self._max_scores
+        for num_placed, score, board, unplaced in beam:
+            if _is_better(num_placed + open_words + len(unplaced), score + open_score + sum(max_scores[word] for word in unplaced), best[0], best[1]):
+                return True
+        return False
+    
+    def _get_board(self):
+        """Returns the state of the board. The board must not be changed
+        afterwards - _set_board() a copy of it instead."""
+        
+        return self.grid, self.flags, self.anchors, self.placed_words, self._journal
+    
+    def _set_board(self, board, copy=True):
+        """Put a copy of a board from _get_board onto the crossword. 
+        Without copy the board itself is used - just to look at it."""
+        
+        grid, flags, anchors, placed_words, journal = board
+        if not copy:
+            self.grid, self.flags, self.anchors, self.placed_words, self._journal = board
+            self._letters = None
+            return
+        self.grid = bytearray(grid)
+        self.flags = bytearray(flags)
+        self.anchors = dict((letter, dict(coords)) for letter, coords in anchors.iteritems())
+        self.placed_words = list(placed_words)
+        self._journal = list(journal)
+        self._letters = None
+    
+    def _finish(self, best_placements, best_score, best_round, force_solved, time_limit):
+        """Put the best round back onto the grid and check if it is good
+        enough in case we ran out of time"""
+        
+        self._restore(best_placements or [])
         self.score = best_score
+        self.best_round = best_round
+        
+        if best_placements is None and time_limit is not None:
+            raise TimeOutError("Could not compute a crossword within %g seconds" % time_limit)
+        if force_solved and len(self.placed_words) < len(self.wordlist):
+            raise TimeOutError("Could not solve the crossword within %g seconds" % time_limit)
         return best_score
+    
+    def _compute_parallel(self, rounds, best_of, force_solved, workers, time_limit, deadline, first_round, search, callback=None):
+        """Spread the best_of rounds of compute_crossword over a pool of
+        worker processes. Each worker computes a consecutive range of 
+        rounds and only ships back its best layout."""
+        
+        entries = [(w.word, w.clue) for w in self._words]
+        
+        ## With force_solved there is no fixed number of rounds - so keep
+        # every worker busy until a solution turns up
+        if force_solved:
+            best_of = max(best_of, workers)
+        shares = [best_of // workers + (i < best_of % workers) for i in range(workers)]
+        
+        best_placements = None
+        best_score = 0
+        best_round = None
+        count = 0
+        start = time.time()
+        
+        pool = multiprocessing.Pool(workers)
+        try:
+            while deadline is None or time.time() < deadline:
+                tasks = []
+                for share in shares:
+                    if share:
+                        tasks.append((self.cols, self.rows, self.empty, self.maxloops, entries, self.engine, rounds, share, False, deadline, self.seed, first_round, search))
+                        first_round += share
+                
+                ## The results are in the order of the rounds - just as 
+                # if they were computed one after another
+                for result in pool.map(_compute_worker, tasks):
+                    ## Workers which didn't finish a single round in time
+                    if result is None:
+                        continue
+                    placements, score, counter, seed, worker_best_round = result
+                    count += counter
+                    if best_placements is None or _is_better(len(placements), score, len(best_placements), best_score):
+                        best_placements = placements
+                        best_score = score
+                        best_round = worker_best_round
+                        if callback is not None:
+                            self._restore([(self._words[i], col, row, vertical) for i, col, row, vertical in placements])
+                            callback(Progress(len(placements), score, best_round, time.time() - start))
+                
+                if not force_solved or (best_placements is not None and len(best_placements) == len(entries)):
+                    break
+                if count >= self.maxloops:
+                    raise MaxLoopError("Could not solve the crossword within %i tries" % self.maxloops)
+        finally:
+            pool.terminate()
+        
+        self.counter += count
+        if best_placements is not None:
+            best_placements = [(self._words[i], col, row, vertical) for i, col, row, vertical in best_placements]
+        return self._finish(best_placements, best_score, best_round, force_solved, time_limit)
+    
+    def _restore(self, placements):
+        """Clear the grid and write the given (word, col, row, vertical)
+        placements onto it"""
+        
+        self._rollback()
+        for word, col, row, vertical in placements:
+            self._write_word(col, row, vertical, word)
  
+    def add_word(self, word, clue=None):
+        """Add a word to the word list and try to place it on the grid as
+        it is now, crossing the words already there. 
+        
+        -- word: The answer or a Word
+        
+        Returns the Placement of the word or None if it did not fit. If 
+        the words are numbered already, the new one gets a number too."""
+        
+        if not isinstance(word, Word):
+            word = Word(word, clue)
+        self._words.append(word)
+        self._index_words()
+        self.wordlist.append(word)
+        
+        num_placed = len(self.placed_words)
+        self._place_word(word)
+        self.score = self._get_total_score()
+        if len(self.placed_words) == num_placed:
+            return None
+        
+        placement = self.placed_words[-1]
+        if any(p.number is not None for p in self.placed_words):
+            self._number_words()
+        return placement
+    
+    def remove_word(self, word):
+        """Remove a word from the word list and from the grid. Letters 
+        of the word which other words cross stay on the grid, the other
+        words keep their numbers.
+        
+        -- word: The answer, its Word or its Placement. If the answer is
+            in the list more than once, a placed one is removed first.
+        
+        Raises a WordListError and changes nothing if two or more of the
+        crosses are side by side - without the word they would be a run
+        of letters with no clue."""
+        
+        placement = entry = None
+        if isinstance(word, Placement):
+            placement = word
+        elif isinstance(word, Word):
+            entry = word
+        else:
+            entry = Word(word)
+        
+        for p in self.placed_words:
+            if p is placement or p.entry is entry or (entry is not None and p.word == entry.word):
+                placement = p
+                break
+        if placement is not None:
+            entry = placement.entry
+        else:
+            for w in self._words:
+                if w is entry or w.word == entry.word:
+                    entry = w
+                    break
+            else:
+                raise WordListError("'%s' is not in the word list" % entry.word)
+        if placement is not None and self._leaves_fragment(placement):
+            raise WordListError("'%s' can't be removed, the words crossing it would be left side by side" % placement.word)
+        
+        self._words.remove(entry)
+        self._index_words()
+        if entry in self.wordlist:
+            self.wordlist.remove(entry)
+        
+        if placement is not None:
+            self.placed_words.remove(placement)
+            self._unwrite_word(placement)
+        self.score = self._get_total_score()
+    
+    def _leaves_fragment(self, placement):
+        """Check if taking a placed word off the grid would leave two of
+        its crosses next to each other. The words crossing it are all 
+        going the other direction, so such crosses form a run of letters
+        which is not a word."""
+        
+        flags = self.flags
+        if placement.vertical:
+            step, other = self._width, ACROSS
+        else:
+            step, other = 1, DOWN
+        pos = placement.row*self._width + placement.col
+        
+        kept = False
+        for letter in placement.word:
+            if flags[pos] & other:
+                if kept:
+                    return True
+                kept = True
+            else:
+                kept = False
+            pos += step
+        return False
+    
+    def _unwrite_word(self, placement):
+        """Take a placed word off the grid and bring flags and anchors 
+        around it up to date"""
+        
+        grid = self.grid
+        flags = self.flags
+        anchors = self.anchors
+        width = self._width
+        
+        if placement.vertical:
+            step, side, direction = width, 1, DOWN
+        else:
+            step, side, direction = 1, width, ACROSS
+        start = pos = placement.row*width + placement.col
+        
+        cleared = []
+        for letter in placement.word:
+            flags[pos] &= ~direction & 0xff
+            ## Crosses stay on the grid
+            if not flags[pos] & (ACROSS | DOWN):
+                grid[pos] = EMPTY_CELL
+                anchors[letter].pop(pos, None)
+                cleared.append(pos)
+            pos += step
+        end = pos
+        
+        for pos in cleared:
+            for cell in (pos-1, pos+1, pos-width, pos+width):
+                row, col = divmod(cell, width)
+                if 1 <= row <= self.rows and 1 <= col <= self.cols:
+                    self._update_blocked(cell)
+        
+        ## A cell might take a crossing word again - the same band as 
+        # in _update_anchors
+        for pos in range(start-step, end+step, step):
+            for cell in (pos-side, pos, pos+side):
+                self._check_anchor(cell)
+        self._letters = None
+    
+    def _update_blocked(self, cell):
+        """Set the blocked flags of a cell from its neighbours"""
+        
+        grid = self.grid
+        width = self._width
+        
+        cell_flags = self.flags[cell] & (ACROSS | DOWN)
+        if grid[cell-1] > BORDER_CELL or grid[cell+1] > BORDER_CELL:
+            cell_flags |= BLOCKED_DOWN
+        if grid[cell-width] > BORDER_CELL or grid[cell+width] > BORDER_CELL:
+            cell_flags |= BLOCKED_ACROSS
+        self.flags[cell] = cell_flags
+    
+    def _check_anchor(self, cell):
+        """Add the cell to the anchor index or drop it from there, 
+        depending on whether a crossing word could still go through it"""
+        
+        grid = self.grid
+        flags = self.flags
+        width = self._width
+        
+        code = grid[cell]
+        if code <= BORDER_CELL:
+            return
+        letter = chr(code)
+        coords = self.anchors.setdefault(letter, {})
+        if flags[cell] & ACROSS and flags[cell] & DOWN:
+            coords.pop(cell, None)
+            return
+        
+        ## The same rules as in _update_anchors
+        vertical = bool(flags[cell] & ACROSS)
+        if vertical:
+            direction, blocked = width, BLOCKED_DOWN
+        else:
+            direction, blocked = 1, BLOCKED_ACROSS
+        before, after = cell-direction, cell+direction
+        if (grid[before] == EMPTY_CELL and not flags[before] & blocked and grid[after] <= BORDER_CELL) or \
+           (grid[after] == EMPTY_CELL and not flags[after] & blocked and grid[before] <= BORDER_CELL):
+            row, col = divmod(cell, width)
+            coords[cell] = (col, row, vertical)
+        else:
+            coords.pop(cell, None)
+    
+    def _get_total_score(self):
+        """The score of the crossword as it is on the grid: Each word but
+        the first one scores 1, and each cross another 1"""
+        
+        if not self.placed_words:
+            return 0
+        return len(self.placed_words) - 1 + len(self.letters["double"])
+    
+    def crop(self):
+        """Returns a copy of the crossword without the empty rows and 
+        columns around the words"""
+        
+        min_col, min_row, max_col, max_row = self._get_bounding_box()
+        cropped = CrossWord(max_col-min_col+1, max_row-min_row+1, self.empty, self.maxloops, self._words, engine=self.engine, seed=self.seed, profile=self.profile)
+        
+        cropped._restore([(p.entry, p.col-min_col+1, p.row-min_row+1, p.vertical) for p in self.placed_words])
+        cropped.score = self.score
+        cropped.counter = self.counter
+        cropped.best_round = self.best_round
+        return cropped
+    
+    def _get_bounding_box(self):
+        """Returns (min_col, min_row, max_col, max_row) of the cells used
+        by the placed words"""
+        
+        if not self.placed_words:
+            return 1, 1, self.cols, self.rows
+        
+        min_col = min_row = sys.maxint
+        max_col = max_row = 0
+        for word in self.placed_words:
+            if word.vertical:
+                end_col, end_row = word.col, word.row + len(word.word) - 1
+            else:
+                end_col, end_row = word.col + len(word.word) - 1, word.row
+            min_col = min(min_col, word.col)
+            min_row = min(min_row, word.row)
+            max_col = max(max_col, end_col)
+            max_row = max(max_row, end_row)
+        return min_col, min_row, max_col, max_row
+    
     def _get_possible_coords(self, word):
         """Generates a list of possible coords.
         
@@ -730,46 +2797,17 @@ class CrossWord(object):
         Additional checking is done later.
         """
 
-        coordlist = []
+        coordlist = self._engine.get_possible_coords(word)
         
-        ## optimizations
-        letters = self.letters
-        cols = self.cols
-        rows = self.rows
-        word_str = word.word
-        word_length = len(word_str)
-        _get_score = self._get_score
-        
-        letterpos = -1
-        #~ for letterpos, letter in enumerate(word.word): ## Enumerate seems to be slower sometimes
-        for letter in word_str:
-            letterpos += 1
-            
-            try:
-                coords = letters[letter]
-            except KeyError:
-                coords = []
-            
-            for col, row in coords:
-                ## VERTICAL
-                if row - letterpos > 0: 
-                    if ((row - letterpos) + word_length) <= rows: 
-                        score = _get_score(col, row - letterpos, 1, word)
-                        if score:
-                            coordlist.append((col, row - letterpos, 1, score))
-                
-                ## HORIZONTAL
-                if col - letterpos > 0:
-                    if ((col - letterpos) + word_length) <= cols: 
-                        score = _get_score(col - letterpos, row, 0, word)
-                        if score:
-                            coordlist.append((col - letterpos, row, 0, score))
-            
         ## The same trick as in the '_randomize_wordlist' methode:
         # The list needs to be sorted (this time by score) but coords
         # with the same score may be shuffled and will lead to 
         # different crosswords each time.
-        random.shuffle(coordlist)
+        # The first sort makes the shuffle independent of the order the
+        # coords were found in, so all engines give the same crosswords
+        # for the same random state.
+        coordlist.sort()
+        self._random.shuffle(coordlist)
         coordlist.sort(key=lambda i: i[3], reverse=True)
         return coordlist
          
@@ -786,7 +2824,7 @@ class CrossWord(object):
         if len(self.placed_words) == 0: 
             while not placed and count <= self.maxloops:
                 ## Place the first word at fixed coords
-                vertical, col, row = random.randrange(0, 2), 1, 1
+                vertical, col, row = self._random.randrange(0, 2), 1, 1
                 
                 ## Place the first word in the middle of the grid
                 if vertical:
@@ -794,11 +2832,13 @@ class CrossWord(object):
                     row = int(round((self.rows + 1) / 2, 0)) - int(round((len(word.word) + 1) / 2, 0))
                     if row+len(word.word) > self.rows:
                         row = self.rows - len(word.word) + 1
+                    row = max(row, 1)
                 else:
                     col = int(round((self.cols + 1) / 2, 0)) - int(round((len(word.word) + 1) / 2, 0))
                     row = int(round((self.rows + 1) / 2, 0))
                     if col+len(word.word) > self.cols:
                         col = self.cols - len(word.word) + 1
+                    col = max(col, 1)
 
                 ## Random place the first word
                 #~ col = random.randrange(1, self.cols + 1)
@@ -834,214 +2874,503 @@ class CrossWord(object):
         -- 1 coord fits - but no cross
         -- n n-1 crosses"""
         
+        if col < 1 or row < 1 or col > self.cols or row > self.rows:
+            return 0
+        
         ## optimizations
-        empty = self.empty
-        _is_empty = self._is_empty
-        _read_cell = self._read_cell
         grid = self.grid
-        #~ def _is_empty(col, row):
-            #~ try: 
-                #~ return grid[col-1][row-1] == empty
-            #~ except IndexError:
-                #~ pass
-            #~ return False
-        
-        if col < 1 or row < 1:
+        flags = self.flags
+        
+        if vertical:
+            step, direction, blocked = self._width, DOWN, BLOCKED_DOWN
+        else:
+            step, direction, blocked = 1, ACROSS, BLOCKED_ACROSS
+        pos = row*self._width + col
+        
+        ## The cell before the first letter must not hold a letter
+        if grid[pos-step] > BORDER_CELL:
             return 0
  
         score = 1
-        letterpos = 0
-        lastletter = empty
         
-        #~ for letterpos, letter in enumerate(word.word):   ## Enumerate is much(!) slower
-        for letter in word.word:
-            letterpos += 1
-            
-            try:
-                active_cell = grid[col-1][row-1]#_read_cell(col, row)
-            except IndexError:
-                return 0
-            
-            ## Still not ideal, but this prevents the code from placing
-            # a word like "nose" over an already placed word like "nosebear"!
-            # This is quite a big issue - so this part really should kept.  
-            #
-            # Another approach would be, to check for each cell if it
-            # already contains a letter, which is written in the same
-            # direction as our word. e.g.:
-            # The active_cell holds an 'e', also our word has an 'e'.
-            # If the 'e' of the active_cell belongs to a vertical word 
-            # and our word is also going to be placed vertically, a match
-            # is not possible as we would overwrite the old world.
-            # If the active_cell belongs to a horizontal word, a cross
-            # would be possible. The downside of this approach: We'd
-            # need an additional dict/list for that info, it would be slower
-            if lastletter != empty and active_cell != empty:
-                return 0
-            lastletter = active_cell
+        for letter in word.codes:
+            active_cell = grid[pos]
             
-            ## In words: If the letter of the current cell does not
-            # match the current letter of our word, the word doesn't
-            # fit!
-            if active_cell != empty and active_cell != letter:
-            #~ if active_cell != empty and letterpos != matching_letter:    ## This will disallow words to be overwritten but it will also disallow multiple matches within one word
-                return 0
+            if active_cell == EMPTY_CELL:
+                ## Only check for non-crosses: The neighbours must not
+                # hold letters (the border is fine)
+                if flags[pos] & blocked:
+                    return 0
             elif active_cell == letter:
+                ## A cross is only possible with a word of the other
+                # direction. This prevents the code from placing a word
+                # like "nose" over an already placed word like "nosebear"!
+                if flags[pos] & direction:
+                    return 0
                 score += 1
+            else:
+                ## In words: If the letter of the current cell does not
+                # match the current letter of our word (or we hit the 
+                # border), the word doesn't fit!
+                return 0
             
-            
-            #
-            # Check for neighbours
-            #
-            if vertical:
-                ## Only check for non-crosses
-                if active_cell != letter: 
-                    # right
-                    if not _is_empty(col+1, row): 
-                        return 0
- 
-                    # left
-                    if not _is_empty(col-1, row): 
-                        return 0
- 
- 
-                ## Only check first and last letter in vertical mode
-                # for top/bottom neighbours. 
-                if letterpos == 1: 
-                    if not _is_empty(col, row-1):
-                        return 0
- 
-                if letterpos == len(word.word): 
-                    if not _is_empty(col, row+1): 
-                        return 0
-            else: 
-                ## Only check for non-crosses
-                if active_cell != letter:
-                    # top
-                    if not _is_empty(col, row-1): 
-                        return 0
- 
-                    # bottom
-                    if not _is_empty(col, row+1): 
-                        return 0
- 
-                ## In horizontal mode only the first and last letter
-                # are not allowed to have horizontal neighours
-                if letterpos == 1: 
-                    if not _is_empty(col-1, row):
-                        return 0
+            pos += step
  
-                if letterpos == len(word.word): 
-                    if not _is_empty(col+1, row):
-                        return 0
-
-            if vertical: 
-                row += 1
-            else: 
-                col += 1
+        ## The cell after the last letter must not hold a letter
+        if grid[pos] > BORDER_CELL:
+            return 0
  
         return score
+    
+    def _get_rejection(self, col, row, vertical, word):
+        """The reason _get_score turned a placement down: "bounds", 
+        "mismatch", "neighbour" or "collinear" (see Profile)"""
+        
+        if col < 1 or row < 1 or col > self.cols or row > self.rows:
+            return "bounds"
+        
+        grid = self.grid
+        flags = self.flags
+        if vertical:
+            step, direction, blocked = self._width, DOWN, BLOCKED_DOWN
+        else:
+            step, direction, blocked = 1, ACROSS, BLOCKED_ACROSS
+        pos = row*self._width + col
+        
+        if grid[pos-step] > BORDER_CELL:
+            return "neighbour"
+        for letter in word.codes:
+            active_cell = grid[pos]
+            if active_cell == EMPTY_CELL:
+                if flags[pos] & blocked:
+                    return "neighbour"
+            elif active_cell == letter:
+                if flags[pos] & direction:
+                    return "collinear"
+            elif active_cell == BORDER_CELL:
+                return "bounds"
+            else:
+                return "mismatch"
+            pos += step
+        return "neighbour"
  
     def _write_word(self, col, row, vertical, word): 
-        """Write a word to the grid and add it to the placed_words list"""
+        """Write a word to the grid and add its Placement to the 
+        placed_words list"""
         
-        word.col = col
-        word.row = row
-        word.vertical = vertical
         #~ if word.word in self.placed_words:
             #~ raise Exception("Word '%s' two times in the crossword!!" % word)
 
-        self.placed_words.append(word)
+        self.placed_words.append(Placement(word, col, row, vertical))
+        
+        ## optimizations
+        grid = self.grid
+        flags = self.flags
+        anchors = self.anchors
+        journal = self._journal
+        width = self._width
+        
+        if vertical:
+            step, direction = width, DOWN
+        else:
+            step, direction = 1, ACROSS
+        start = pos = row*width + col
 
-        for letter in word.word:
-            #~ self.cells.append((col, row, vertical))
-                
-            self._write_cell(col, row, letter)
+        for letter, code in zip(word.word, word.codes):
+            flags[pos] |= direction
+            if grid[pos] == code:
+                ## A cross: No other word can use this cell any more
+                anchors[letter].pop(pos, None)
+            else:
+                grid[pos] = code
+                journal.append(pos)
+                flags[pos-1] |= BLOCKED_DOWN
+                flags[pos+1] |= BLOCKED_DOWN
+                flags[pos-width] |= BLOCKED_ACROSS
+                flags[pos+width] |= BLOCKED_ACROSS
+                ## Words crossing this one will go the other direction
+                if letter in anchors:
+                    anchors[letter][pos] = (col, row, not vertical)
+                else:
+                    anchors[letter] = {pos: (col, row, not vertical)}
             if vertical:
                 row += 1
             else:
                 col += 1
-        return
- 
-    def _write_cell(self, col, row, letter):
-        """Set a cell on the grid to a given letter"""
+            pos += step
         
-        try:
-            if not (col, row) in self.letters[letter]:
-                self.letters[letter].append((col, row)) 
-            else:
-                ## Remove coords from the list, if they already
-                # contain a cross. This way we do less double-checking.
-                self.letters[letter].remove((col, row)) 
-                self.letters["double"].append((col, row)) 
-        except KeyError:
-            self.letters[letter] = []
-            self.letters[letter].append((col, row))
+        self._letters = None
+        self._update_anchors(start, pos, step)
+ 
+    def _update_anchors(self, start, end, step):
+        """Drop anchors next to a freshly written word which can't take
+        a crossing word any more.
         
-        self.grid[col-1][row-1] = letter
+        Any cell a crossing word might use in order to reach an anchor
+        is a direct or diagonal neighbour of that anchor. So only the
+        anchors in the band around the word from 'start' to 'end'
+        (exclusive) need to be checked again."""
         
+        grid = self.grid
+        flags = self.flags
+        anchors = self.anchors
+        width = self._width
+        if step == 1:
+            side = width
+        else:
+            side = 1
+        
+        for pos in range(start-step, end+step, step):
+            for cell in (pos-side, pos, pos+side):
+                code = grid[cell]
+                if code <= BORDER_CELL:
+                    continue
+                letter = chr(code)
+                try:
+                    col, row, vertical = anchors[letter][cell]
+                except KeyError:
+                    continue
+                
+                ## A crossing word needs at least one more cell before
+                # or after the anchor. That cell must be empty and must
+                # not have letters as neighbours, and the cell on the
+                # other side of the anchor must not hold a letter.
+                if vertical:
+                    direction, blocked = width, BLOCKED_DOWN
+                else:
+                    direction, blocked = 1, BLOCKED_ACROSS
+                before, after = cell-direction, cell+direction
+                if grid[before] == EMPTY_CELL and not flags[before] & blocked and grid[after] <= BORDER_CELL:
+                    continue
+                if grid[after] == EMPTY_CELL and not flags[after] & blocked and grid[before] <= BORDER_CELL:
+                    continue
+                del anchors[letter][cell]
+ 
     def _read_cell(self, col, row):
         """Get the content of a cell"""
         
-        return self.grid[col-1][row-1]
+        code = self.grid[row*self._width + col]
+        if code > BORDER_CELL:
+            return chr(code)
+        return self.empty
  
     def _is_empty(self, col, row):
-        """Check if a given cell is empty"""
+        """Check if a given cell is empty. The border is not empty."""
         
-        try:
-            return self.grid[col-1][row-1] == self.empty
-        except IndexError:
-            pass
-        return False
+        return self.grid[row*self._width + col] == EMPTY_CELL
+
+    @property
+    def letters(self):
+        """Maps each letter to the list of (col, row) cells holding it.
+        Cells used by two words (crosses) are listed under "double".
+        
+        This is built from the grid on demand - the generator itself
+        only uses the anchor index."""
+        
+        if self._letters is None:
+            self._letters = self._collect_letters()
+        return self._letters
+
+    def _collect_letters(self):
+        """Build the letters dict from the grid"""
+        
+        grid = self.grid
+        flags = self.flags
+        width = self._width
+        
+        letters = {}
+        for letter in string.lowercase: letters[letter]=[]
+        letters["double"]=[]
+        
+        for row in range(1, self.rows+1):
+            for col in range(1, self.cols+1):
+                pos = row*width + col
+                code = grid[pos]
+                if code <= BORDER_CELL:
+                    continue
+                if flags[pos] & ACROSS and flags[pos] & DOWN:
+                    letters["double"].append((col, row))
+                else:
+                    letters.setdefault(chr(code), []).append((col, row))
+        return letters
+
+    def _get_rows(self):
+        """Returns the grid as a list of rows, each row being a list of
+        cell strings (letters or the empty string)"""
+        
+        grid = self.grid
+        width = self._width
+        empty = self.empty
+        
+        rows = []
+        for row in range(1, self.rows+1):
+            start = row*width + 1
+            rows.append([chr(code) if code > BORDER_CELL else empty for code in grid[start:start+self.cols]])
+        return rows
 
     def _number_words(self): 
         """Orders the words and applies numbers to them
         
         Words starting at the same cell will get the same number (e.g.
-        'ask' and 'air' would become 1-across and 1-down.)
+        'ask' and 'air' would become 1-across and 1-down.) Words which 
+        have a number already keep it, so words added later can be 
+        numbered without changing the others.
         """
     
         self.placed_words.sort(key=lambda i: (i.col + i.row))
         
+        ## Across and down are counted on their own. A number shared by 
+        # words starting at the same cell is skipped in both directions,
+        # as it is taken in both of them.
+        counters = {True: 1, False: 1}
+        taken = {True: set(), False: set()}
+        starts = {}
+        for word in self.placed_words:
+            starts.setdefault((word.col, word.row), []).append(word)
+            if word.number is not None:
+                taken[bool(word.vertical)].add(word.number)
         
-        across_count, down_count = 1, 1
+        for word in self.placed_words:
+            if word.number is not None:
+                continue
+            
+            group = starts[(word.col, word.row)]
+            directions = set(bool(w.vertical) for w in group)
+            numbered = [w for w in group if w.number is not None]
+            new = [w for w in group if w.number is None]
+            if numbered and not any(numbered[0].number in taken[bool(w.vertical)] for w in new):
+                number = numbered[0].number
+            else:
+                ## The number of the cell is taken in the direction of
+                # the new word - so the cell gets a new one
+                for w in numbered:
+                    taken[bool(w.vertical)].discard(w.number)
+                    new.append(w)
+                direction = bool(word.vertical)
+                number = counters[direction]
+                while any(number in taken[d] for d in directions):
+                    number += 1
+                counters[direction] = number + 1
+            
+            for w in new:
+                w.number = number
+                taken[bool(w.vertical)].add(number)
+
+class PlacementEngine(object):
+    """Finds the places a word could go on the grid of a crossword.
+    
+    An engine only looks at its crossword: The grid, the cell flags and 
+    the anchor index are kept up to date by CrossWord._write_word and 
+    must not be changed by the engine. Engines giving the same result
+    for the same board give the same crosswords for the same seed - 
+    check_engines() compares them.
+    
+    Subclasses are made selectable by name with register_engine()."""
+    
+    def __init__(self, crossword):
+        self.crossword = crossword
+    
+    def get_possible_coords(self, word):
+        """Returns the (col, row, vertical, score) tuples of the places 
+        where the word fits and crosses at least one other word. A place
+        with n crosses is in the list n times, in any order. The score is
+        the one of CrossWord._get_score."""
         
-        ignore_num = []
+        raise NotImplementedError
+
+class PythonEngine(PlacementEngine):
+    """The "python" engine: Each anchor holding a letter of the word is 
+    a possible cross, the placement it leads to is scored on its own."""
+    
+    def get_possible_coords(self, word):
+        """Scores the word at every anchor"""
         
-        for word in self.placed_words:
-            if word.number == None:
-                if word.vertical:
-                    while across_count in ignore_num:
-                        across_count +=1
-                    word.number = across_count
-                    across_count +=1
-                else:
-                    while down_count in ignore_num:
-                        down_count +=1
-                    word.number = down_count
-                    down_count +=1
-                    
-                ## Check if any other word starts at the same coords
-                # in that case apply the same number to that word
-                for word2 in self.placed_words:
-                    if word2.col == word.col and word2.row == word.row and word2 is not word:
-                        word2.number = word.number
-                        ignore_num.append(word.number)
+        coordlist = []
+        
+        ## optimizations
+        crossword = self.crossword
+        anchors = crossword.anchors
+        cols = crossword.cols
+        rows = crossword.rows
+        word_str = word.word
+        word_length = len(word_str)
+        _get_score = crossword._get_score
+        profile = crossword.profile
+        
+        letterpos = -1
+        #~ for letterpos, letter in enumerate(word.word): ## Enumerate seems to be slower sometimes
+        for letter in word_str:
+            letterpos += 1
+            
+            try:
+                coords = anchors[letter]
+            except KeyError:
+                continue
+            
+            for col, row, vertical in coords.itervalues():
+                ## VERTICAL
+                if vertical:
+                    if row - letterpos > 0 and (row - letterpos) + word_length - 1 <= rows: 
+                        score = _get_score(col, row - letterpos, 1, word)
+                        if score:
+                            coordlist.append((col, row - letterpos, 1, score))
+                    elif profile is not None:
+                        profile.rejections["bounds"] += 1
+                
+                ## HORIZONTAL
+                elif col - letterpos > 0 and (col - letterpos) + word_length - 1 <= cols: 
+                    score = _get_score(col - letterpos, row, 0, word)
+                    if score:
+                        coordlist.append((col - letterpos, row, 0, score))
+                elif profile is not None:
+                    profile.rejections["bounds"] += 1
+        
+        return coordlist
+         
+class NumpyEngine(PlacementEngine):
+    """The "numpy" engine
+    
+    Instead of calling CrossWord._get_score for each anchor, all candidate
+    start positions of a word are scored in one vectorized pass. The grid
+    and the cell flags are used as numpy arrays without copying them.
+    The result is the same list of (col, row, vertical, score) tuples as
+    the one of the "python" engine (up to the order)."""
+    
+    def __init__(self, crossword):
+        if numpy is None:
+            raise ImportError("The numpy engine needs numpy")
+        PlacementEngine.__init__(self, crossword)
+    
+    def get_possible_coords(self, word):
+        """Returns the scored placements of the word which cross at least
+        one other word. Just like with the "python" engine, a placement with n 
+        crosses is in the list n times."""
+        
+        crossword = self.crossword
+        anchors = crossword.anchors
+        width = crossword._width
+        
+        ## Collect the grid position of every anchor holding one of our 
+        # letters and the position of that letter in our word
+        positions, letterpositions = [], []
+        for letterpos, letter in enumerate(word.word):
+            coords = anchors.get(letter)
+            if coords:
+                positions.append(numpy.fromiter(coords, dtype=int, count=len(coords)))
+                letterpositions.append(numpy.repeat(letterpos, len(coords)))
+        if not positions:
+            return []
+        positions = numpy.concatenate(positions)
+        letterpositions = numpy.concatenate(letterpositions)
+        
+        grid = numpy.frombuffer(crossword.grid, dtype=numpy.uint8)
+        flags = numpy.frombuffer(crossword.flags, dtype=numpy.uint8)
+        occupied = grid > BORDER_CELL
+        
+        ## Anchors of horizontal words take vertical words and vice versa
+        vertical_anchors = (flags[positions] & ACROSS) != 0
+        
+        codes = numpy.array(word.codes, dtype=numpy.uint8)
+        length = len(codes)
+        coordlist = []
+        for vertical, step, direction, blocked in ((0, 1, ACROSS, BLOCKED_ACROSS), (1, width, DOWN, BLOCKED_DOWN)):
+            if vertical:
+                selected = vertical_anchors
+            else:
+                selected = ~vertical_anchors
+            starts = positions[selected] - letterpositions[selected]*step
+            rows, cols = starts // width, starts % width
+            
+            ## The word has to stay on the grid
+            if vertical:
+                inside = (rows >= 1) & (rows + length - 1 <= crossword.rows)
+            else:
+                inside = (cols >= 1) & (cols + length - 1 <= crossword.cols)
+            starts, rows, cols = starts[inside], rows[inside], cols[inside]
+            if not len(starts):
+                continue
+            
+            ## cells[i] are the cells the word would cover at starts[i]
+            cells_index = starts[:, numpy.newaxis] + numpy.arange(length)*step
+            cells = grid[cells_index]
+            cell_flags = flags[cells_index]
+            
+            ## Each cell must either hold the word's letter of a word in 
+            # the other direction (cross) or be empty without neighbours.
+            # The border is neither of them.
+            match = cells == codes
+            fits = ((match & (cell_flags & direction == 0)) | ((cells == EMPTY_CELL) & (cell_flags & blocked == 0))).all(axis=1)
+            
+            ## No letters directly before or after the word
+            fits &= ~occupied[starts-step] & ~occupied[starts+length*step]
+            
+            scores = match.sum(axis=1)[fits] + 1
+            coordlist.extend(zip(cols[fits].tolist(), rows[fits].tolist(), [vertical]*len(scores), scores.tolist()))
+        return coordlist
+
+## The placement engines by name
+ENGINES = {}
+
+def register_engine(name, engine_class):
+    """Make a PlacementEngine subclass selectable by name - e.g. with
+    CrossWord(engine=name) or --engine name"""
+    
+    ENGINES[name] = engine_class
+
+register_engine("python", PythonEngine)
+register_engine("numpy", NumpyEngine)
+
+def _encode_answer(answer):
+    """The grid stores one byte per letter. Unicode answers are stored as
+    latin-1, so each letter still takes one cell - answers with letters
+    beyond latin-1 can't go on the grid."""
+    
+    if not isinstance(answer, unicode):
+        return answer
+    try:
+        return answer.encode("latin-1")
+    except UnicodeEncodeError:
+        raise WordListError("Answer '%s' has letters which can't go on the grid, only latin-1 letters can" % answer.encode("utf-8"))
 
 class Word(object):
+    """An entry of the word list. Words are never changed after they
+    were created, so all rounds - and all the crosswords made from the
+    same list - share them. Where a word went is kept in a Placement."""
+    
+    __slots__ = ("word", "clue", "length", "codes", "histogram")
+    
     def __init__(self, word=None, clue=None):
-        self.word = re.sub(r'\s', '', word.lower())
+        if isinstance(clue, unicode):
+            clue = clue.encode("utf-8")
+        self.word = intern(_encode_answer(re.sub(r'\s', '', word.lower())))
         self.clue = clue
-        self.length = len(word) ## Much faster than asking for len(word)
-
-        self.row = None
-        self.col = None
-        self.vertical = None
-        self.number = None
-        
-        ## Used if the word is a solution-field (colored)
-        self.solution = False
-        self.solution_char = None
+        self.length = len(self.word) ## Much faster than asking for len(word)
+        ## The letters as they are stored on the grid
+        self.codes = tuple(bytearray(self.word))
+        ## How often each letter is in the word
+        self.histogram = {}
+        for letter in self.word:
+            self.histogram[letter] = self.histogram.get(letter, 0) + 1
+    
+    @classmethod
+    def from_normalized(cls, word, clue, histogram=None):
+        """Create a Word from an answer which is normalized already (lower
+        case, no whitespace) - e.g. one of a CompiledBank"""
+        
+        word = _encode_answer(word)
+        if isinstance(clue, unicode):
+            clue = clue.encode("utf-8")
+        self = cls.__new__(cls)
+        self.word = intern(word)
+        self.clue = clue
+        self.length = len(word)
+        self.codes = tuple(bytearray(word))
+        if histogram is None:
+            histogram = {}
+            for letter in word:
+                histogram[letter] = histogram.get(letter, 0) + 1
+        self.histogram = histogram
+        return self
     
     def __len__(self):
         print("Please use len(word.word) to ask for the length of the word - this is much faster")
@@ -1055,13 +3384,221 @@ class Word(object):
         #~ else:
             #~ raise KeyError
 
+class Placement(object):
+    """A word placed on the grid of a crossword. It offers the attributes
+    of the word, so the formatters can use it just like one."""
+    
+    __slots__ = ("entry", "col", "row", "vertical", "number")
+    
+    def __init__(self, entry, col, row, vertical):
+        self.entry = entry
+        self.col = col
+        self.row = row
+        self.vertical = vertical
+        self.number = None
+    
+    @property
+    def word(self):
+        return self.entry.word
+    
+    @property
+    def clue(self):
+        return self.entry.clue
+    
+    @property
+    def length(self):
+        return self.entry.length
+
+def _serve_worker(job):
+    """Compute and format one crossword for the CrossWordServer, in a 
+    pool process. Returns (HTTP status, content type, body)."""
+    
+    time_limit = job["deadline"] - time.time()
+    if time_limit <= 0:
+        return 504, "text/plain", "The request waited too long to be started"
+    
+    try:
+        words = []
+        for answer, clue in job["words"]:
+            words.append((answer, clue))
+        
+        if job.get("fit"):
+            cross, score = fit_crossword(words, " ", 5000, best_of=job.get("best_of", 3), time_limit=time_limit, seed=job.get("seed"), engine=job.get("engine", "python"), search=job.get("search", "greedy"))
+        else:
+            cross = CrossWord(job.get("cols", "auto"), job.get("rows", "auto"), " ", 5000, words, engine=job.get("engine", "python"))
+            score = cross.compute_crossword(best_of=job.get("best_of", 3), time_limit=time_limit, seed=job.get("seed"), search=job.get("search", "greedy"))
+        
+        formatter = CrossWordFormatter(cross, solution=job.get("solution"))
+        output = job.get("format", "json")
+        if output == "json":
+            ## The answers came as unicode, so the letters are latin-1
+            placed = [dict(word=p.word.decode("latin-1"), clue=p.clue, col=p.col, row=p.row, vertical=bool(p.vertical), number=p.number) for p in cross.placed_words]
+            tmplist = [p.entry for p in cross.placed_words]
+            missing = [w.word.decode("latin-1") for w in cross._words if w not in tmplist]
+            body = json.dumps(dict(cols=cross.cols, rows=cross.rows, score=score, seed=cross.seed, best_round=cross.best_round, placed=placed, missing=missing, grid=["".join(row).decode("latin-1") for row in cross._get_rows()]))
+            return 200, "application/json", body
+        elif output == "ascii":
+            grid = formatter.get_crossword_ascii_grid(job.get("solved", False), True).decode("latin-1").encode("utf-8")
+            return 200, "text/plain; charset=utf-8", "%s\n%s" % (grid, formatter.get_crossword_ascii_cues())
+        elif output == "png":
+            image = StringIO.StringIO()
+            formatter.get_crossword_image_grid(output=image, solved=job.get("solved", False))
+            return 200, "image/png", image.getvalue()
+        return 400, "text/plain", "Unknown format '%s'" % output
+    except TimeOutError, inst:
+        return 504, "text/plain", str(inst)
+    except (WordListError, SolutionError, MaxLoopError, ValueError), inst:
+        return 400, "text/plain", str(inst)
+
+def _check_job(job):
+    """Check the fields of a /generate request before it is queued (see
+    CrossWordRequestHandler). Raises a ValueError with a message for the
+    client if one is missing or of the wrong type."""
+    
+    def is_int(value):
+        return isinstance(value, (int, long)) and not isinstance(value, bool)
+    
+    if not isinstance(job, dict) or not isinstance(job.get("words"), list):
+        raise ValueError("Expected a JSON object with a list of words")
+    for pair in job["words"]:
+        if not isinstance(pair, list) or len(pair) != 2 or not all(isinstance(text, basestring) for text in pair):
+            raise ValueError("Each of the words must be a list of two strings: [answer, clue]")
+    
+    for key in ("cols", "rows"):
+        if key in job and job[key] != "auto" and not (is_int(job[key]) and job[key] > 0):
+            raise ValueError("%s must be a positive whole number or \"auto\"" % key)
+    if "best_of" in job and not (is_int(job["best_of"]) and job["best_of"] > 0):
+        raise ValueError("best_of must be a positive whole number")
+    if job.get("seed") is not None and not is_int(job["seed"]):
+        raise ValueError("seed must be a whole number")
+    if "time_limit" in job and not (isinstance(job["time_limit"], (int, long, float)) and not isinstance(job["time_limit"], bool)):
+        raise ValueError("time_limit must be a number")
+    for key in ("engine", "search", "format", "solution"):
+        if job.get(key) is not None and not isinstance(job[key], basestring):
+            raise ValueError("%s must be a string" % key)
+    for key in ("fit", "solved"):
+        if key in job and not isinstance(job[key], bool):
+            raise ValueError("%s must be true or false" % key)
+
+class CrossWordRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """The HTTP interface of the CrossWordServer
+    
+    POST /generate with a JSON object: 
+        words: List of [answer, clue]
+        cols, rows: Grid size (Default: "auto")
+        fit: Search the smallest grid instead, see fit_crossword
+        best_of, seed, engine, search: See CrossWord.compute_crossword
+        time_limit: Seconds until the crossword must be done, waiting
+            in the queue included (Default and maximum: the one of the 
+            server)
+        format: "json" (Default), "ascii" or "png"
+        solution, solved: See CrossWordFormatter
+    
+    GET /status returns the number of workers and pending requests."""
+    
+    def do_POST(self):
+        if self.path != "/generate":
+            return self._send(404, "text/plain", "Not found")
+        try:
+            job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            _check_job(job)
+        except ValueError, inst:
+            return self._send(400, "text/plain", str(inst))
+        self._send(*self.server.submit(job))
+    
+    def do_GET(self):
+        if self.path != "/status":
+            return self._send(404, "text/plain", "Not found")
+        server = self.server
+        self._send(200, "application/json", json.dumps(dict(workers=server.workers, pending=server.pending, max_pending=server.max_pending)))
+    
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logging.info("%s - %s" % (self.address_string(), format % args))
+
+class CrossWordServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """A long running HTTP service computing crosswords, see 
+    CrossWordRequestHandler. Each request is handled in a thread of its
+    own, the crosswords are computed in a pool of worker processes. 
+    
+    -- workers: Size of the pool - the number of crosswords computed at
+        the same time
+    -- max_pending: Number of requests being computed or waiting for a 
+        worker. More requests are turned down with 503. 
+        (Default: 4*workers)
+    -- time_limit: Deadline of each request in seconds. The rounds of a 
+        crossword stop at the deadline, so a request which is given up
+        doesn't keep its worker busy. (Default: 30)
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, address, workers=1, max_pending=None, time_limit=30):
+        BaseHTTPServer.HTTPServer.__init__(self, address, CrossWordRequestHandler)
+        self.workers = workers
+        if max_pending is None:
+            max_pending = 4*workers
+        self.max_pending = max_pending
+        self.time_limit = time_limit
+        self.pending = 0
+        self._lock = threading.Lock()
+        self.pool = multiprocessing.Pool(workers)
+    
+    def submit(self, job):
+        """Have a crossword computed in the pool and wait for it. Returns
+        (HTTP status, content type, body)."""
+        
+        with self._lock:
+            if self.pending >= self.max_pending:
+                return 503, "text/plain", "Too many pending requests"
+            self.pending += 1
+        try:
+            try:
+                time_limit = min(float(job.get("time_limit", self.time_limit)), self.time_limit)
+            except (TypeError, ValueError):
+                return 400, "text/plain", "time_limit must be a number"
+            job["deadline"] = time.time() + time_limit
+            result = self.pool.apply_async(_serve_worker, (job,))
+            ## A little extra time for formatting and sending it back
+            try:
+                return result.get(max(job["deadline"] - time.time(), 0) + 1)
+            except multiprocessing.TimeoutError:
+                return 504, "text/plain", "Could not compute a crossword within %g seconds" % time_limit
+            except Exception, inst:
+                logging.exception("Computing a crossword failed")
+                return 500, "text/plain", str(inst)
+        finally:
+            with self._lock:
+                self.pending -= 1
+    
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        self.pool.terminate()
+
 if __name__ == "__main__":
     parser = OptionParser()
     general_group = OptionGroup(parser, "General Options")
     general_group.add_option("--nopsyco", help="Do not import psyco", dest="nopsyco", default=False, action="store_true")
-    general_group.add_option("--benchmark", help="Run a benchmark-test", dest="benchmark", default=None, action="store_true")
+    general_group.add_option("--benchmark", help="Run a benchmark-test on made up words (with --seed, --engine, --search and --workers)", dest="benchmark", default=None, action="store_true")
     general_group.add_option("--benchmark-settings", help="Format: 'x,y,z' x=Number of words on each crossword, y=Number of crosswords to generate, z=Each crossword should be the best of ...?", dest="bsettings", default="100,100,3", action="store")
+    general_group.add_option("--benchmark-output", help="Save the benchmark result as JSON to this file", dest="boutput", default=None, action="store")
+    general_group.add_option("--benchmark-baseline", help="Compare the benchmark with the JSON result of an earlier one. Exits with 1 if generating got slower", dest="bbaseline", default=None, action="store")
+    general_group.add_option("--benchmark-repeats", help="How often to time the benchmark crosswords, to tell changes from noise (Default: 5)", dest="brepeats", default=5, type="int")
     general_group.add_option("--stats", help="Print stats", dest="stats", default=None, action="store_true")
+    general_group.add_option("--batch", help="Compute and render the crosswords of all .cwf files in the given directory (or matching the given glob pattern) with --workers processes, printing a status line for each file. Files that fail are reported and skipped. With --output being a directory, the images are written there", dest="batch", default=None, action="store")
+    general_group.add_option("--serve", help="Run an HTTP service computing crosswords at [host:]port (see CrossWordRequestHandler) - with --workers processes and --time-limit as the deadline of each request", dest="serve", default=None, action="store")
+    general_group.add_option("--max-pending", help="Number of requests the service takes at the same time (Default: 4*workers)", dest="max_pending", default=None, type="int", action="store")
+    general_group.add_option("--profile", help="Print counters and timings of each crossword as JSON (see Profile)", dest="profile", default=False, action="store_true")
+    general_group.add_option("--compile-bank", help="Compile the questions of the input files into one binary bank - which loads much faster and is used just like a .cwf file", dest="compile_bank", default=None, action="store")
+    general_group.add_option("--check-engines", help="Check that all placement engines compute the same crosswords for the input file(s) (with --seed: for that seed, else for the seeds 0-9)", dest="check_engines", default=False, action="store_true")
+    general_group.add_option("--cache", help="Directory to cache computed crosswords in. Only used together with --seed", dest="cache", default=None, action="store")
+    general_group.add_option("--cache-size", help="Maximum size of the cache in MB (Default: 10)", dest="cache_size", default=10, type="float", action="store")
     parser.add_option_group(general_group)
     
     crossword_group = OptionGroup(parser, "Crossword Options")
@@ -1069,7 +3606,20 @@ if __name__ == "__main__":
     crossword_group.add_option("-r", "--rows", help="Number of rows to use (Default: auto)", dest="rows", default="auto", action="store")
     crossword_group.add_option("-s", "--solution", help="The crossword's solution (some colored fields which letters can be used to build a word).\nNote: This will overwrite any solution defined in the input file(s)!! ", action="store", dest="solution", default=None)
     crossword_group.add_option("--solved", help="Create a solved crossword", action="store_true", dest="solved", default = False)
+    crossword_group.add_option("--sample", help="Use n questions drawn at random from each input file instead of all of them - with --seed the same ones. The questions are found through an index file stored next to the input file (FILE.idx)", action="store", dest="sample", default=None, type="int")
+    crossword_group.add_option("--select", help="Use n words of each input file (or of the --sample drawn from it) which cross each other well (see select_words)", action="store", dest="select", default=None, type="int")
+    crossword_group.add_option("--select-method", help="'greedy' picks the words crossing best, 'stochastic' picks among the best at random (Default: greedy)", action="store", dest="select_method", default="greedy", type="choice", choices=["greedy", "stochastic"])
+    crossword_group.add_option("--min-length", help="Shortest answer --select picks", action="store", dest="min_length", default=None, type="int")
+    crossword_group.add_option("--max-length", help="Longest answer --select picks", action="store", dest="max_length", default=None, type="int")
+    crossword_group.add_option("--fit", help="Search the smallest grid all words fit into (--cols and --rows are ignored, --time-limit is the time for the whole search)", action="store_true", dest="fit", default=False)
     crossword_group.add_option("-b", "--bestof", help="Create n crosswords and keep the best", action="store", dest="bestof", default=3, type="int")
+    crossword_group.add_option("--engine", help="Placement engine: %s - 'numpy' needs numpy and is faster on big word lists (Default: python)" % ", ".join(sorted(ENGINES)), action="store", dest="engine", default="python", type="choice", choices=sorted(ENGINES))
+    crossword_group.add_option("--search", help="'greedy' puts each word at its best place, 'beam' keeps the --beam-width best boards after each word (Default: greedy)", action="store", dest="search", default="greedy", type="choice", choices=["greedy", "beam"])
+    crossword_group.add_option("--beam-width", help="Number of boards the beam search keeps (Default: 8)", action="store", dest="beam_width", default=8, type="int")
+    crossword_group.add_option("--beam-expand", help="Number of places the beam search tries for each word on each board (Default: 3)", action="store", dest="beam_expand", default=3, type="int")
+    crossword_group.add_option("-t", "--time-limit", help="Stop computing a crossword after n seconds and keep the best one so far", action="store", dest="time_limit", default=None, type="float")
+    crossword_group.add_option("--seed", help="Seed for the random generator - the same seed gives the same crossword (Default: random)", action="store", dest="seed", default=None, type="int")
+    crossword_group.add_option("-w", "--workers", help="Number of processes to spread the --bestof crosswords (or the --benchmark crosswords) over (Default: 1)", action="store", dest="workers", default=1, type="int")
     parser.add_option_group(crossword_group)
     
     output_group = OptionGroup(parser, "Output Options")
@@ -1087,14 +3637,55 @@ if __name__ == "__main__":
     if options.benchmark:
         if options.bsettings:
             w, n, b = options.bsettings.split(",")
-        run_benchmark_test(words=int(w.strip()), num=int(n.strip()), bestof=int(b.strip()))
+        if options.seed is None:
+            options.seed = 0
+        if not run_benchmark_test(words=int(w.strip()), num=int(n.strip()), bestof=int(b.strip()), workers=options.workers, seed=options.seed, engine=options.engine, search=options.search, output=options.boutput, baseline=options.bbaseline, repeats=options.brepeats):
+            sys.exit(1)
         sys.exit(0)
     
+    if options.serve:
+        host, sep, port = options.serve.rpartition(":")
+        server = CrossWordServer((host or "localhost", int(port)), workers=options.workers, max_pending=options.max_pending, time_limit=options.time_limit or 30)
+        print("Serving crosswords on http://%s:%i/generate" % server.server_address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        sys.exit(0)
+    
+    if options.batch:
+        if os.path.isdir(options.batch):
+            inputfiles = sorted(glob.glob(os.path.join(options.batch, "*.cwf")))
+        else:
+            inputfiles = sorted(glob.glob(options.batch))
+        if options.columns.isdigit():
+            options.columns = int(options.columns)
+        if options.rows.isdigit():
+            options.rows = int(options.rows)
+        
+        start = time.time()
+        failed = 0
+        results = batch_crosswords(inputfiles, workers=options.workers, output=options.output, solved=options.solved, ppb=options.ppb, solution=options.solution, cols=options.columns, rows=options.rows, fit=options.fit, best_of=options.bestof, time_limit=options.time_limit, seed=options.seed, engine=options.engine, search=options.search, beam_width=options.beam_width, beam_expand=options.beam_expand, cache=options.cache, cache_size=int(options.cache_size*1024*1024))
+        for result in results:
+            if result.error is not None:
+                failed += 1
+                print("%s: FAILED %s" % (result.inputfile, result.error))
+            else:
+                print("%s: %i/%i words, score %i, parse %.2fs, compute %.2fs, render %.2fs -> %s" % (result.inputfile, result.num_placed, result.num_words, result.score, result.parse_time, result.compute_time, result.render_time, result.output))
+            sys.stdout.flush()
+        print("%i files, %i failed, %.2f seconds" % (len(inputfiles), failed, time.time()-start))
+        sys.exit(failed and 1 or 0)
+    
     if args == []:
         parser.print_help()
         print("You need to specify an input file")
         sys.exit(0)
-    if not options.create_image and not options.print_crossword:
+    if options.compile_bank:
+        print("Compiled %i questions into '%s'" % (compile_bank(args, options.compile_bank), options.compile_bank))
+        sys.exit(0)
+    if not options.create_image and not options.print_crossword and not options.check_engines:
         parser.print_help()
         print("You need to specify the desired output format")
         sys.exit(0)
@@ -1108,49 +3699,90 @@ if __name__ == "__main__":
     if options.rows.isdigit():
         options.rows = int(options.rows)
     
+    if options.check_engines:
+        if options.seed is not None:
+            seeds = [options.seed]
+        else:
+            seeds = range(10)
+        failed = False
+        for inputfile in args:
+            wordlist = SimpleParser(inputfile).get_questions()
+            for seed, engine in check_engines(wordlist, options.columns, options.rows, seeds=seeds, best_of=options.bestof, search=options.search):
+                print("%s: Engine '%s' differs with seed %i" % (inputfile, engine, seed))
+                failed = True
+        if failed:
+            sys.exit(1)
+        print("All engines agree")
+        sys.exit(0)
+    
     #~ input = []
     #~ for filename in args:
         #~ input += glob.glob(filename)
     #~ print options.input
 
+    if options.cache:
+        cache = ResultCache(options.cache, int(options.cache_size*1024*1024))
+    else:
+        cache = None
+    
     counter = 0
     for inputfile in args:
-        if len(args) == 1:
-            if options.output:
-                output = options.output
-            else:
-                output = "%s.png" % os.path.splitext(inputfile)[0]
-                c = 1
-                while os.path.exists(output):
-                    output = "%s_%i.png" % (os.path.splitext(inputfile)[0], c)
-                    c += 1
+        if len(args) == 1 and options.output:
+            output = options.output
         else:
-            if options.output:
-                filename = options.output
-            else:
-                filename = inputfile
-            output = "%s.png" % (os.path.splitext(filename)[0])
-            c = 1
-            while os.path.exists(output):
-                output = "%s_%i.png" % (os.path.splitext(filename)[0], c)
-                c += 1
+            output = None
 
-        parser = SimpleParser(inputfile)
+        if options.sample and is_compiled_bank(inputfile):
+            bank = CompiledBank(inputfile)
+            file_options = bank.options
+            wordlist = bank.sample(options.sample, seed=options.seed)
+            bank.close()
+        elif options.select and is_compiled_bank(inputfile):
+            ## select_words draws its pool from the bank itself
+            wordlist = CompiledBank(inputfile)
+            file_options = wordlist.options
+        elif options.sample:
+            bank = QuestionBank(inputfile)
+            file_options = bank.options
+            wordlist = bank.sample(options.sample, seed=options.seed)
+            bank.close()
+        else:
+            parser = SimpleParser(inputfile)
+            file_options = parser.dict["options"]
+            wordlist = parser.get_questions()
+        
+        if options.select:
+            selected = select_words(wordlist, options.select, options.min_length, options.max_length, options.select_method, options.seed)
+            if isinstance(wordlist, CompiledBank):
+                wordlist.close()
+            wordlist = selected
+        
         if options.solution:
             solution = options.solution
-        elif parser.has_option("solution"):
-            solution = parser.get_option("solution")
+        elif "solution" in file_options:
+            solution = file_options["solution"]
         else:
             solution = None
         
-        wordlist = parser.get_questions()
-        cwd = CrossWord(options.columns, options.rows, " ", 5000, wordlist)
-        score = cwd.compute_crossword(best_of=options.bestof, force_solved=False)   
+        if options.profile:
+            profile = Profile()
+        else:
+            profile = None
+        try:
+            if options.fit:
+                cwd, score = fit_crossword(wordlist, " ", 5000, best_of=options.bestof, time_limit=options.time_limit, seed=options.seed, workers=options.workers, engine=options.engine, cache=cache, search=options.search, beam_width=options.beam_width, beam_expand=options.beam_expand, profile=profile)
+            else:
+                cwd = CrossWord(options.columns, options.rows, " ", 5000, wordlist, engine=options.engine, profile=profile)
+                score = cwd.compute_crossword(best_of=options.bestof, force_solved=False, workers=options.workers, time_limit=options.time_limit, seed=options.seed, cache=cache, search=options.search, beam_width=options.beam_width, beam_expand=options.beam_expand)
+        except TimeOutError, inst:
+            print("%s: %s" % (inputfile, inst))
+            continue
+
     
         tmplist = [w.word.lower() for w in cwd.placed_words]
         missing = [w.word for w in cwd.wordlist if w.word.lower() not in tmplist]
         if missing != []:
-            print("Could not place some words. Probably your grid is too small. Sometimes setting \"--bestof\" to a higer value also help.")
+            print("Could not place some words. Probably your grid is too small. Sometimes setting \"--bestof\" to a higer value also help - or let \"--fit\" search a grid size.")
             print("Words that could not be placed: '%s'" % missing)
     
         if options.stats:
@@ -1159,7 +3791,18 @@ if __name__ == "__main__":
         formatter = CrossWordFormatter(cwd, ppb=options.ppb, solution=solution)
             
         if options.create_image:
-            formatter.get_crossword_image_grid(output=output)
+            if output is None:
+                output = reserve_output(os.path.splitext(options.output or inputfile)[0])
+                reserved = True
+            else:
+                reserved = False
+            try:
+                formatter.get_crossword_image_grid(output=output)
+            except:
+                ## Don't leave an empty image behind
+                if reserved and os.path.exists(output) and os.path.getsize(output) == 0:
+                    os.remove(output)
+                raise
             if options.solved:
                 formatter.get_crossword_image_grid(output=output.replace(".png", "_solved.png"), solved=True)
         if options.print_crossword:
@@ -1167,5 +3810,7 @@ if __name__ == "__main__":
             print "Sorry, the print-crossword-formatter is still buggy!\n"
         if options.print_clues:
             print formatter.get_crossword_ascii_cues()
+        if profile is not None:
+            print json.dumps(dict(profile.as_dict(), file=inputfile), sort_keys=True)
             
         counter += 1
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding:utf-8
+
+## Run with: python -m unittest test_crossword
+
+import random
+import unittest
+import StringIO
+
+import crossword
+from crossword import CrossWord, SimpleParser, WordListError
+
+
+def letter_runs(cw):
+    """All runs of two or more letters on the grid as (letters, col,
+    row, vertical) tuples"""
+
+    rows = cw._get_rows()
+    runs = set()
+    for vertical, lines in ((False, rows), (True, zip(*rows))):
+        for i, line in enumerate(lines):
+            start = None
+            for j, cell in enumerate(list(line) + [cw.empty]):
+                if cell != cw.empty:
+                    if start is None:
+                        start = j
+                    continue
+                if start is not None and j - start >= 2:
+                    if vertical:
+                        runs.add(("".join(line[start:j]), i+1, start+1, True))
+                    else:
+                        runs.add(("".join(line[start:j]), start+1, i+1, False))
+                start = None
+    return runs
+
+
+class AddRemoveWordTest(unittest.TestCase):
+
+    def test_every_run_is_a_placed_word(self):
+        for seed in range(60):
+            rnd = random.Random(seed)
+            words = ["".join(rnd.choice("abcdelmnorstuvz") for i in range(rnd.randint(3, 9))) for j in range(40)]
+            cw = CrossWord(15, 15, "-", 5000, [[w, "clue"] for w in words[:15]], seed=seed)
+            cw.compute_crossword(rounds=2)
+            new_words = words[15:]
+            for edit in range(10):
+                if rnd.random() < 0.5 and cw.placed_words:
+                    try:
+                        cw.remove_word(rnd.choice(cw.placed_words))
+                    except WordListError:
+                        pass
+                elif new_words:
+                    cw.add_word(new_words.pop(), "clue")
+                placed = set((p.word, p.col, p.row, bool(p.vertical)) for p in cw.placed_words if len(p.word) >= 2)
+                self.assertEqual(letter_runs(cw), placed, "seed %i, edit %i" % (seed, edit))
+
+    def test_refused_removal_changes_nothing(self):
+        ## 'xa' and 'xc' go down from the first two letters of 'xxy'
+        cw = CrossWord(5, 5, "-", 100, [["xxy", "1"], ["xa", "2"], ["xc", "3"]])
+        cw._restore([(w, col, row, vertical) for w, col, row, vertical in zip(cw._words, (1, 1, 2), (1, 1, 1), (False, True, True))])
+        grid = str(cw.grid)
+        self.assertRaises(WordListError, cw.remove_word, "xxy")
+        self.assertEqual(str(cw.grid), grid)
+        self.assertEqual(len(cw.placed_words), 3)
+        self.assertEqual(len(cw.wordlist), 3)
+
+
+class SimpleParserTest(unittest.TestCase):
+
+    def parse(self, text):
+        parser = SimpleParser()
+        for section, answer, question in parser.iter_pairs(StringIO.StringIO(text)):
+            parser.dict[section].append((answer, question))
+        return parser
+
+    def test_question_first_after_other_options(self):
+        parser = self.parse("[options]\ntitle=x\n[questions]\nq1=a1\n[options]\nquestion first=false\n")
+        self.assertEqual(parser.get_questions(), [("q1", "a1")])
+        self.assertEqual(parser.get_option("title"), "x")
+
+    def test_split_sections_keep_file_order(self):
+        parser = self.parse("[questions]\nq1=a1\n[options]\nquestion first=true\n[questions]\nq2=a2\n")
+        self.assertEqual(parser.get_questions(), [("a1", "q1"), ("a2", "q2")])
+
+
+if __name__ == "__main__":
+    unittest.main()